@@ -0,0 +1,152 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from config import config
+
+# --- ADMISSION CONTROL FOR MODEL CALLS ---
+# Every call to the model goes through one controller per process. It caps how
+# many calls run at once, queues the rest by priority, sheds calls whose deadline
+# passes while they wait, and stops calling a backend that keeps failing.
+
+PRIORITY_NOTIFICATION = 0   # answering someone who replied to you
+PRIORITY_POST = 1           # starting a new thread during the main loop
+PRIORITY_SCROLL = 2         # replying to something found while scrolling
+PRIORITY_INIT = 3           # opening posts and other work that can wait
+
+FAILURE_THRESHOLD = 5       # consecutive failures before the circuit opens
+RESET_AFTER = 30.0          # seconds the circuit stays open before one probe call is let through
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call is shed (deadline passed) or refused (circuit open)."""
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=None, default_timeout=None,
+                 failure_threshold=FAILURE_THRESHOLD, reset_after=RESET_AFTER):
+        # Unset limits come from model.concurrency and model.queue_timeout
+        self.max_concurrent = max_concurrent if max_concurrent is not None else config['model.concurrency']
+        self.default_timeout = default_timeout if default_timeout is not None else config['model.queue_timeout']
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._cond = threading.Condition()
+        self._queue = []                # heap of [priority, seq, state]; state: 'waiting'/'granted'/'cancelled'
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._state = 'closed'          # circuit: 'closed', 'open' or 'half_open'
+        self._open_until = 0.0
+        self._consecutive_failures = 0
+        self._stats = {'admitted': 0, 'shed': 0, 'rejected_open': 0, 'failures': 0, 'rate_limited': 0,
+                       'max_queue_depth': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+
+    def configure(self, max_concurrent=None, default_timeout=None):
+        """Applies new limits, by default the current config. Entry points call this once
+        the command line has been applied, since the controller is built at import."""
+        with self._cond:
+            self.max_concurrent = max_concurrent if max_concurrent is not None else config['model.concurrency']
+            self.default_timeout = default_timeout if default_timeout is not None else config['model.queue_timeout']
+            self._grant_waiting()       # a higher limit admits queued calls straight away
+
+    # --- CIRCUIT BREAKER ---
+    def _check_circuit(self):
+        if self._state == 'open':
+            if time.monotonic() < self._open_until:
+                self._stats['rejected_open'] += 1
+                raise AdmissionRejected('circuit open')
+            self._state = 'half_open'
+            return True     # this caller is the probe
+        if self._state == 'half_open':
+            self._stats['rejected_open'] += 1
+            raise AdmissionRejected('circuit half-open, probe in flight')
+        return False
+
+    def record_success(self):
+        with self._cond:
+            self._consecutive_failures = 0
+            self._state = 'closed'
+
+    def record_rate_limited(self):
+        """A call turned away by the backend's rate limit: not a failure, so it doesn't count
+        towards opening the circuit. A probe that got one lets the next caller probe."""
+        with self._cond:
+            self._stats['rate_limited'] += 1
+            if self._state == 'half_open':
+                self._state, self._open_until = 'open', 0.0
+
+    def record_failure(self):
+        with self._cond:
+            self._stats['failures'] += 1
+            self._consecutive_failures += 1
+            if self._state == 'half_open' or self._consecutive_failures >= self.failure_threshold:
+                self._state = 'open'
+                self._open_until = time.monotonic() + self.reset_after
+
+    # --- QUEUE ---
+    def acquire(self, priority=PRIORITY_SCROLL, timeout=None):
+        """Waits for a slot. Raises AdmissionRejected if the deadline passes or the circuit is open."""
+        deadline = time.monotonic() + (self.default_timeout if timeout is None else timeout)
+        with self._cond:
+            is_probe = self._check_circuit()
+            started = time.monotonic()
+            if self._in_flight < self.max_concurrent:   # release() never leaves waiters behind a free slot
+                self._in_flight += 1
+            else:
+                entry = [priority, next(self._seq), 'waiting']
+                heapq.heappush(self._queue, entry)
+                self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._queue))
+                while entry[2] != 'granted':
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        entry[2] = 'cancelled'
+                        self._stats['shed'] += 1
+                        if is_probe:
+                            self._state, self._open_until = 'open', 0.0    # let the next caller probe
+                        raise AdmissionRejected('deadline passed while queued')
+                    self._cond.wait(remaining)
+            waited = time.monotonic() - started
+            self._stats['admitted'] += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._grant_waiting()
+
+    def _grant_waiting(self):
+        """Hands free slots to queued callers, best priority first. Call with _cond held."""
+        while self._queue and self._in_flight < self.max_concurrent:
+            entry = heapq.heappop(self._queue)
+            if entry[2] == 'cancelled': continue
+            entry[2] = 'granted'
+            self._in_flight += 1
+        self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, priority=PRIORITY_SCROLL, timeout=None):
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self):
+        with self._cond:
+            admitted = self._stats['admitted']
+            return {
+                'queue_depth': sum(1 for e in self._queue if e[2] == 'waiting'),
+                'in_flight': self._in_flight,
+                'circuit': self._state,
+                **self._stats,
+                'wait_avg': self._stats['wait_total'] / admitted if admitted else 0.0,
+            }
+
+
+# One controller per process, shared by every caller of get_ai_response
+controller = AdmissionController()
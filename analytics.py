@@ -0,0 +1,166 @@
+import threading
+from array import array
+
+# --- REPLY-GRAPH ANALYTICS ---
+# Builds the persona -> persona reply graph from the comments table, one batch of
+# new comments at a time. A reply to a comment points at that comment's author;
+# a top-level comment points at the post's author. Edge weights live in a dense
+# n x n array so degree and reciprocity are plain array scans. One graph is
+# shared by every viewer session, so reads and updates go through one lock.
+
+class ReplyGraph:
+    def __init__(self, storage, batch_size=500):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.last_comment_id = 0
+        self.version = 0
+        self.names = []
+        self.index = {}
+        self._capacity = 0
+        self._weights = array('l')          # row = replier, column = person replied to
+        self._comment_author = {}           # comment id -> persona index
+        self._comment_depth = {}            # comment id -> depth (top-level comment = 1)
+        self._comment_root = {}             # comment id -> id of its top-level comment
+        self._cascade_size = {}             # top-level comment id -> comments in its subtree
+        self._depth_counts = array('l')
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    # --- INCREMENTAL BUILD ---
+    def refresh(self):
+        """Reads comments written since the last refresh. Returns how many were added."""
+        added = 0
+        with self._lock:
+            while True:
+                rows = self.storage.iter_comments_after(self.last_comment_id, self.batch_size)
+                for row in rows:
+                    self.observe(row['id'], row['author_name'], row['parent_comment_id'], row['post_author'])
+                added += len(rows)
+                if len(rows) < self.batch_size: break
+        return added
+
+    def observe(self, comment_id, author, parent_comment_id, post_author):
+        """Adds one comment to the graph. A comment seen before is ignored."""
+        with self._lock:
+            if comment_id in self._comment_author: return
+            self._observe(comment_id, author, parent_comment_id, post_author)
+
+    def _observe(self, comment_id, author, parent_comment_id, post_author):
+        replier = self._persona_index(author)
+        if parent_comment_id in self._comment_author:
+            target = self._comment_author[parent_comment_id]
+            depth = self._comment_depth[parent_comment_id] + 1
+            root = self._comment_root[parent_comment_id]
+        else:
+            target = self._persona_index(post_author)
+            depth = 1
+            root = comment_id
+
+        self._comment_author[comment_id] = replier
+        self._comment_depth[comment_id] = depth
+        self._comment_root[comment_id] = root
+        self._cascade_size[root] = self._cascade_size.get(root, 0) + 1
+        while len(self._depth_counts) <= depth:
+            self._depth_counts.append(0)
+        self._depth_counts[depth] += 1
+        if replier != target:
+            self._weights[replier * self._capacity + target] += 1
+
+        self.last_comment_id = max(self.last_comment_id, comment_id)
+        self.version += 1
+
+    def _persona_index(self, name):
+        i = self.index.get(name)
+        if i is not None: return i
+        i = len(self.names)
+        self.names.append(name)
+        self.index[name] = i
+        if i >= self._capacity:
+            self._grow(max(8, self._capacity * 2))
+        return i
+
+    def _grow(self, capacity):
+        old, old_capacity = self._weights, self._capacity
+        self._weights = array('l', bytes(capacity * capacity * array('l').itemsize))
+        for r in range(old_capacity):
+            self._weights[r * capacity:r * capacity + old_capacity] = old[r * old_capacity:(r + 1) * old_capacity]
+        self._capacity = capacity
+
+    def weight(self, replier, target):
+        """How many times `replier` has replied to `target`."""
+        with self._lock:
+            i, j = self.index.get(replier), self.index.get(target)
+            if i is None or j is None: return 0
+            return self._weights[i * self._capacity + j]
+
+    # --- CACHED QUERIES ---
+    def _cached(self, key, compute):
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is None or hit[0] != self.version:
+                hit = (self.version, compute())
+                self._cache[key] = hit
+            return hit[1]
+
+    def persona_stats(self):
+        """Per-persona degree, weighted degree and reciprocity."""
+        return self._cached('persona_stats', self._compute_persona_stats)
+
+    def _compute_persona_stats(self):
+        n, cap, w = len(self.names), self._capacity, self._weights
+        stats = []
+        for i in range(n):
+            row = w[i * cap:i * cap + n]
+            out_neighbours = [j for j in range(n) if row[j]]
+            in_neighbours = [j for j in range(n) if w[j * cap + i]]
+            mutual = sum(1 for j in out_neighbours if w[j * cap + i])
+            stats.append({
+                'persona': self.names[i],
+                'out_degree': len(out_neighbours),
+                'in_degree': len(in_neighbours),
+                'replies_sent': sum(row),
+                'replies_received': sum(w[j * cap + i] for j in range(n)),
+                'reciprocity': round(mutual / len(out_neighbours), 3) if out_neighbours else 0.0,
+            })
+        return stats
+
+    def reciprocity(self):
+        """Share of directed reply edges that are answered by an edge back."""
+        def compute():
+            n, cap, w = len(self.names), self._capacity, self._weights
+            edges = mutual = 0
+            for i in range(n):
+                for j in range(n):
+                    if w[i * cap + j]:
+                        edges += 1
+                        if w[j * cap + i]: mutual += 1
+            return round(mutual / edges, 3) if edges else 0.0
+        return self._cached('reciprocity', compute)
+
+    def depth_distribution(self):
+        """{depth: number of comments at that depth}."""
+        return self._cached('depth_distribution',
+                            lambda: {d: c for d, c in enumerate(self._depth_counts) if c})
+
+    def cascade_sizes(self):
+        """{cascade size: number of top-level comments whose subtree has that many comments}."""
+        def compute():
+            counts = {}
+            for size in self._cascade_size.values():
+                counts[size] = counts.get(size, 0) + 1
+            return dict(sorted(counts.items()))
+        return self._cached('cascade_sizes', compute)
+
+    def largest_cascades(self, limit=10):
+        return self._cached(('largest_cascades', limit), lambda: sorted(
+            self._cascade_size.items(), key=lambda item: item[1], reverse=True)[:limit])
+
+    def summary(self):
+        with self._lock:
+            return {
+                'comments': sum(self._depth_counts),
+                'personas': len(self.names),
+                'reciprocity': self.reciprocity(),
+                'max_depth': len(self._depth_counts) - 1 if self._depth_counts else 0,
+                'cascades': len(self._cascade_size),
+            }
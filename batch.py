@@ -0,0 +1,177 @@
+import argparse
+import itertools
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from topics import load_topics
+
+# --- BATCH RUNNER ---
+# Runs many independent conversations for dataset building. The matrix of
+# participant sets x topics x turn counts x seeds is expanded into jobs, each
+# job runs simulation.run_simulation in a worker process, and the parent
+# process writes every result to a SQLite results store. Jobs already stored
+# are skipped, so an interrupted batch can simply be started again.
+
+RESULTS_PATH = 'batch_results.db'
+
+RESULTS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS batch_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        participants TEXT NOT NULL,
+        subreddit TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        num_turns INTEGER NOT NULL,
+        seed INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        error TEXT,
+        started_at REAL,
+        seconds REAL,
+        entries INTEGER DEFAULT 0,
+        UNIQUE (participants, subreddit, topic, num_turns, seed)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS batch_entries (
+        run_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        type TEXT,
+        author TEXT NOT NULL,
+        text TEXT,
+        is_post INTEGER DEFAULT 0,
+        is_error INTEGER DEFAULT 0,
+        elapsed REAL,
+        PRIMARY KEY (run_id, seq),
+        FOREIGN KEY (run_id) REFERENCES batch_runs (id)
+    )
+    ''',
+]
+
+# Columns added since the first results databases were written: (table, column, definition)
+RESULTS_MIGRATIONS = [
+    ('batch_entries', 'type', 'TEXT'),
+]
+
+
+def build_jobs(participant_sets, topics, turn_counts, seeds):
+    """Every combination of the matrix as a job dict."""
+    return [{'participants': list(participants), 'topic': dict(topic), 'num_turns': turns, 'seed': seed}
+            for participants, topic, turns, seed in itertools.product(participant_sets, topics, turn_counts, seeds)]
+
+
+def run_job(job):
+    """Runs one conversation in a worker process and returns its entries with timing."""
+    from simulation import run_simulation
+    started_at = time.time()
+    started = time.perf_counter()
+    entries, error = [], None
+    try:
+        for entry in run_simulation(job['participants'], job['num_turns'],
+                                    topic_data=job['topic'], seed=job['seed']):
+            entries.append(dict(entry, elapsed=round(time.perf_counter() - started, 3)))
+            if entry.get('is_error'): error = entry['text']
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {'job': job, 'entries': entries, 'error': error,
+            'started_at': started_at, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+# --- RESULTS STORE ---
+def _job_key(job):
+    return (','.join(job['participants']), job['topic']['subreddit'], job['topic']['topic'], job['num_turns'], job['seed'])
+
+def open_results(path=RESULTS_PATH):
+    conn = sqlite3.connect(path)
+    for statement in RESULTS_SCHEMA:
+        conn.execute(statement)
+    for table, column, definition in RESULTS_MIGRATIONS:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    conn.commit()
+    return conn
+
+def completed_keys(conn):
+    rows = conn.execute("SELECT participants, subreddit, topic, num_turns, seed FROM batch_runs WHERE status = 'ok'")
+    return set(rows.fetchall())
+
+def save_result(conn, result):
+    """Replaces any earlier attempt at the same job with this one."""
+    key = _job_key(result['job'])
+    status = 'error' if result['error'] else 'ok'
+    with conn:
+        old = conn.execute("SELECT id FROM batch_runs WHERE participants = ? AND subreddit = ? AND topic = ? "
+                           "AND num_turns = ? AND seed = ?", key).fetchone()
+        if old:
+            conn.execute("DELETE FROM batch_entries WHERE run_id = ?", (old[0],))
+            conn.execute("DELETE FROM batch_runs WHERE id = ?", (old[0],))
+        cursor = conn.execute(
+            "INSERT INTO batch_runs (participants, subreddit, topic, num_turns, seed, status, error, started_at, seconds, entries) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + (status, result['error'], result['started_at'], result['seconds'], len(result['entries'])))
+        conn.executemany(
+            "INSERT INTO batch_entries (run_id, seq, type, author, text, is_post, is_error, elapsed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(cursor.lastrowid, seq, e.get('type'), e['author'], e['text'], int(bool(e.get('is_post'))), int(bool(e.get('is_error'))), e['elapsed'])
+             for seq, e in enumerate(result['entries'])])
+    return cursor.lastrowid
+
+
+# --- DRIVER ---
+def run_batch(jobs, workers=None, results_path=RESULTS_PATH, resume=True):
+    """Runs `jobs` across a process pool, storing each result as it finishes. Returns (ok, failed, skipped)."""
+    conn = open_results(results_path)
+    done = completed_keys(conn) if resume else set()
+    pending = [job for job in jobs if _job_key(job) not in done]
+    skipped = len(jobs) - len(pending)
+    ok = failed = 0
+    started = time.perf_counter()
+    print(f"--- BATCH START: {len(pending)} runs ({skipped} already stored) ---")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_job, job): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. killed); record it so the job is retried next time
+                    result = {'job': job, 'entries': [], 'error': f"{type(e).__name__}: {e}",
+                              'started_at': time.time(), 'seconds': 0.0}
+                save_result(conn, result)
+                if result['error']: failed += 1
+                else: ok += 1
+                print(f"[{ok + failed}/{len(pending)}] {','.join(job['participants'])} | {job['topic']['subreddit']} | "
+                      f"turns={job['num_turns']} seed={job['seed']}: "
+                      f"{'ERROR ' + result['error'] if result['error'] else 'ok'} ({result['seconds']:.1f}s)")
+    finally:
+        conn.close()
+    print(f"--- BATCH END: {ok} ok, {failed} failed in {time.perf_counter() - started:.1f}s ---")
+    return ok, failed, skipped
+
+
+def parse_topic(text):
+    """'r/Sub::Topic text' -> {'subreddit', 'topic'}."""
+    subreddit, sep, topic = text.partition('::')
+    if not sep or not subreddit.strip() or not topic.strip():
+        raise argparse.ArgumentTypeError(f"expected 'r/Subreddit::topic text', got {text!r}")
+    return {'subreddit': subreddit.strip(), 'topic': topic.strip()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a matrix of independent simulations in parallel.")
+    parser.add_argument('--participants', action='append', metavar='NAME,NAME',
+                        help="Comma-separated persona set; repeat for more sets (default: jax,kaelen).")
+    parser.add_argument('--topic', action='append', type=parse_topic, metavar="'r/Sub::topic'",
+                        help="A topic to run; repeat for more (default: every topic in topics.json).")
+    parser.add_argument('--turns', type=int, nargs='+', default=[5], help="Turn counts to run (default: 5).")
+    parser.add_argument('--seeds', type=int, default=1, help="Seeds per combination, 0..N-1 (default: 1).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes (default: CPU count).")
+    parser.add_argument('--results', default=RESULTS_PATH, help=f"Results database (default: {RESULTS_PATH}).")
+    parser.add_argument('--no-resume', action='store_true', help="Rerun jobs that are already stored.")
+    args = parser.parse_args()
+
+    participant_sets = [[name.strip() for name in s.split(',') if name.strip()] for s in (args.participants or ['jax,kaelen'])]
+    jobs = build_jobs(participant_sets, args.topic or load_topics(), args.turns, range(args.seeds))
+    run_batch(jobs, workers=args.workers, results_path=args.results, resume=not args.no_resume)
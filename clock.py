@@ -0,0 +1,41 @@
+import calendar
+import datetime
+import threading
+import time
+
+# --- TIMESTAMPS ---
+# Posts and comments are ordered by integer microseconds since the epoch (UTC).
+# The process-wide clock never hands out the same value twice and never goes
+# backwards, so rows written in the same second still sort in write order.
+
+class MonotonicClock:
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def now_us(self):
+        with self._lock:
+            now = time.time_ns() // 1000
+            self._last = now if now > self._last else self._last + 1
+            return self._last
+
+
+clock = MonotonicClock()
+
+def now_us():
+    return clock.now_us()
+
+def to_micros(value):
+    """Microseconds for an int (returned as is), a date, a datetime or an ISO string. Naive values are UTC."""
+    if value is None or isinstance(value, int): return value
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return calendar.timegm(value.timetuple()) * 1_000_000 + value.microsecond
+
+def format_micros(us):
+    """The 'YYYY-MM-DD HH:MM:SS' text kept in the timestamp columns."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(us // 1_000_000))
@@ -0,0 +1,217 @@
+import json
+import os
+import signal
+import threading
+
+# --- CONFIGURATION ---
+# Every tunable in one table. Values are layered, later layers winning:
+#   defaults below < genesis.json (or $GENESIS_CONFIG) < preset < environment < --set overrides
+# The preset (only max_speed for now) comes from --preset, $GENESIS_PRESET or a "preset" key in the file.
+# A setting's environment variable is GENESIS_<SECTION>_<NAME> unless the table names
+# an older one. Values are coerced to the setting's type; bad values are reported and
+# skipped. The file is re-read when it changes (reload_if_changed, or SIGHUP), and
+# code that reads config values at the point of use picks the change up without a
+# restart. Settings marked "at start" are only read once.
+
+CONFIG_PATH = os.environ.get('GENESIS_CONFIG', 'genesis.json')
+
+# name: (type, default, environment variable or None, description)
+SETTINGS = {
+    # engine
+    'engine.participants': (list, ["helios", "nyx", "jax", "glitch"], None, "personas the engine runs (at start)"),
+    'engine.tactic_cooldown': (int, 2, None, "a persona's recent tactics it won't pick again"),
+    'engine.style_cooldown': (int, 1, None, "a persona's recent styles it won't pick again"),
+    'engine.thread_max_age': (float, 6 * 60 * 60.0, None, "seconds before a thread drops out of feeds"),
+    'engine.thread_max_comments': (int, 50, None, "comments after which a thread is archived"),
+    'engine.notification_reply_chance': (float, 0.9, None, "chance a persona answers a reply to its post"),
+    'engine.reply_chance': (float, 0.8, None, "chance a scrolling persona writes a reply"),
+    'engine.comment_target_chance': (float, 0.8, None, "chance that reply goes to a comment rather than the post"),
+    # timing: artificial pauses, all zeroed by the max_speed preset
+    'timing.action_pause': (float, 1.0, None, "seconds after a persona posts or replies"),
+    'timing.init_post_pause': (float, 1.0, None, "seconds between opening posts"),
+    'timing.lurk_pause_min': (float, 2.0, None, "seconds a lurking persona idles, at least"),
+    'timing.lurk_pause_max': (float, 5.0, None, "seconds a lurking persona idles, at most"),
+    'timing.turn_pause_min': (float, 2.0, None, "seconds between turns, at least"),
+    'timing.turn_pause_max': (float, 5.0, None, "seconds between turns, at most"),
+    'timing.viewer_refresh': (float, 10.0, None, "seconds between viewer auto-refreshes"),
+    # one-off simulations (mainr.py, app.py, service.py)
+    'simulation.participants': (list, ["jax", "kaelen"], None, "personas in a mainr.py run"),
+    'simulation.num_turns': (int, 5, None, "replies per participant in a mainr.py run"),
+    'simulation.tactic_cooldown': (int, 2, None, "a persona's recent tactics it won't pick again"),
+    'simulation.impulsive_style_chance': (float, 0.65, None, "chance a style is picked without asking the model"),
+    'simulation.impulsive_tactic_chance': (float, 0.5, None, "chance a tactic is picked without asking the model"),
+    'app.participants': (list, ["helios", "nyx"], None, "participants preselected in app.py"),
+    'app.num_turns': (int, 3, None, "replies per participant preselected in app.py"),
+    # scheduler
+    'scheduler.calls_per_minute': (float, 12.0, 'GENESIS_PERSONA_CALLS_PER_MINUTE', "model calls per persona at activity_level 1.0 (at start)"),
+    'scheduler.burst': (int, 4, None, "model calls a persona can save up (at start)"),
+    # model
+    'model.name': (str, 'gemini-2.5-flash-lite', 'GENESIS_MODEL', "main model (at start)"),
+    'model.fast_name': (str, '', 'GENESIS_FAST_MODEL', "optional cheaper model for choices and titles (at start)"),
+    'model.concurrency': (int, 4, 'GENESIS_LLM_CONCURRENCY', "model calls in flight at once (at start)"),
+    'model.queue_timeout': (float, 60.0, 'GENESIS_LLM_QUEUE_TIMEOUT', "seconds a call may wait for a slot (at start)"),
+    # database
+    'db.storage': (str, 'sqlite', 'GENESIS_STORAGE', "engine storage backend: sqlite or memory (at start)"),
+    'db.snapshot_seconds': (float, 5.0, 'GENESIS_SNAPSHOT_SECONDS', "viewer snapshot age; 0 reads live (at start)"),
+    'db.journal_path': (str, 'pending_writes.jsonl', None, "write-ahead journal for generated posts and comments (at start)"),
+}
+
+# Settings that must be above zero; anything else would stall or crash their users
+# (a zero call rate, for one, is a division by zero in the fair scheduler)
+POSITIVE = {'scheduler.calls_per_minute', 'scheduler.burst', 'model.concurrency'}
+
+PRESETS = {
+    'max_speed': {name: 0 for name in SETTINGS if name.startswith('timing.')},
+}
+
+
+def env_name(name):
+    return SETTINGS[name][2] or 'GENESIS_' + name.replace('.', '_').upper()
+
+def coerce(name, value):
+    """`value` as the setting's type. Strings from the environment or the command line
+    are parsed; lists are comma-separated there. Raises ValueError."""
+    value = _parse(name, value)
+    if name in POSITIVE and not value > 0:
+        raise ValueError(f"{name} must be greater than 0, got {value!r}")
+    return value
+
+def _parse(name, value):
+    kind = SETTINGS[name][0]
+    if isinstance(value, str) and kind is not str:
+        text = value.strip()
+        if kind is bool:
+            if text.lower() in ('1', 'true', 'yes', 'on'): return True
+            if text.lower() in ('0', 'false', 'no', 'off', ''): return False
+        elif kind is list:
+            return [item.strip() for item in text.split(',') if item.strip()]
+        else:
+            try:
+                return kind(text)
+            except ValueError:
+                pass
+        raise ValueError(f"{name} expects {kind.__name__}, got '{value}'")
+    if kind is list:
+        if isinstance(value, (list, tuple)): return list(value)
+    elif isinstance(value, bool) == (kind is bool) and isinstance(value, (str, int, float)):
+        if kind is not int or value == int(value):
+            return kind(value)
+    raise ValueError(f"{name} expects {kind.__name__}, got {value!r}")
+
+
+class Config:
+    def __init__(self, path=CONFIG_PATH, preset=None, overrides=None):
+        self.path = path
+        self.preset = preset
+        self.overrides = dict(overrides or {})
+        self.values = {name: spec[1] for name, spec in SETTINGS.items()}
+        self._mtime = None
+        self._reload_requested = False      # set by SIGHUP, acted on by reload_if_changed
+        self._lock = threading.Lock()
+        self.load()
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    def _read_file(self):
+        try:
+            self._mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            self._mtime = None
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Config error: could not read {self.path}: {e}")
+            return {}
+        # Both {"engine": {"reply_chance": 0.5}} and {"engine.reply_chance": 0.5} are accepted
+        flat = {}
+        for key, value in data.items():
+            if isinstance(value, dict) and not key.count('.'):
+                flat.update((f"{key}.{sub}", subvalue) for sub, subvalue in value.items())
+            else:
+                flat[key] = value
+        return flat
+
+    def load(self):
+        """Rebuilds the values from every layer. Returns {name: (old, new)} for what changed."""
+        with self._lock:
+            values = {name: spec[1] for name, spec in SETTINGS.items()}
+            file_values = self._read_file()
+            file_preset = file_values.pop('preset', None)
+            preset = self.preset or os.environ.get('GENESIS_PRESET') or file_preset
+            if preset and preset not in PRESETS:
+                print(f"Config error: unknown preset '{preset}'. Choose one of: {', '.join(PRESETS)}")
+                preset = None
+            environment = {name: os.environ[env_name(name)] for name in SETTINGS if env_name(name) in os.environ}
+            for source, layer in ((self.path, file_values), (f"preset {preset}", PRESETS.get(preset, {})),
+                                  ('environment', environment), ('--set', self.overrides)):
+                for name, value in layer.items():
+                    if name not in SETTINGS:
+                        print(f"Config error: unknown setting '{name}' in {source}")
+                        continue
+                    try:
+                        values[name] = coerce(name, value)
+                    except ValueError as e:
+                        print(f"Config error in {source}: {e}")
+            changed = {name: (self.values[name], value) for name, value in values.items() if self.values[name] != value}
+            self.values = values
+            self.active_preset = preset
+            return changed
+
+    def reload_if_changed(self):
+        """Re-reads the file if it was created, edited or removed since the last load, or
+        if a SIGHUP asked for it. Returns what changed, as load() does."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime and not self._reload_requested: return {}
+        self._reload_requested = False
+        changed = self.load()
+        for name, (old, new) in changed.items():
+            note = " (takes effect on restart)" if '(at start)' in SETTINGS[name][3] else ""
+            print(f"[CONFIG] {name}: {old} -> {new}{note}")
+        return changed
+
+    def apply_cli(self, path=None, preset=None, overrides=()):
+        """Applies --config, --preset and --set KEY=VALUE arguments, then reloads."""
+        if path: self.path = path
+        if preset: self.preset = preset
+        for item in overrides:
+            name, sep, value = item.partition('=')
+            if not sep:
+                print(f"Config error: --set expects KEY=VALUE, got '{item}'")
+                continue
+            self.overrides[name.strip()] = value
+        self.load()
+
+    def install_reload_signal(self):
+        """Reloads the file on SIGHUP (where the platform has it), at the next
+        reload_if_changed(). Call from the main thread."""
+        if not hasattr(signal, 'SIGHUP'): return False
+        signal.signal(signal.SIGHUP, self._on_sighup)
+        return True
+
+    def _on_sighup(self, *_):
+        # Only a flag: the handler may interrupt load() while it holds the lock
+        self._reload_requested = True
+
+
+def add_arguments(parser):
+    """The --config/--preset/--set options shared by the command-line tools."""
+    parser.add_argument('--config', default=None, help=f"Settings file (default: $GENESIS_CONFIG or {CONFIG_PATH}).")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default=None,
+                        help="Settings preset; max_speed removes every artificial pause.")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="Override one setting, e.g. --set timing.turn_pause_max=1 (repeatable).")
+
+def describe():
+    """Every setting with its current value, for --show-config."""
+    return '\n'.join(f"{name} = {json.dumps(config[name])}    # {spec[3]}" for name, spec in SETTINGS.items())
+
+
+config = Config()
@@ -0,0 +1,36 @@
+import json
+import os
+
+# --- PERSONA & PROMPT UTILITIES ---
+# Standard library only, so viewers, replay tools and workers can use these
+# without importing the model SDK (see mainr.py for the model side).
+
+PERSONAS_DIR = 'personas'
+
+def load_persona(persona_name):
+    """Loads a persona JSON file from the 'personas' folder."""
+    try:
+        with open(os.path.join(PERSONAS_DIR, f'{persona_name}.json'), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: Persona file for '{persona_name}' not found.")
+        return None
+
+def build_prompt(persona_data, prompt, use_full_backstory=False):
+    """Wraps a task prompt in the persona's identity (and optionally backstory)."""
+    system_prompt = f"""
+    You are a human being in an online discussion.
+    Your identity:
+    - Name: {persona_data['name']}
+    - Archetype: {persona_data['archetype']}
+    - From: {persona_data['demographics']['location']}
+    - Voice: {persona_data['speech_patterns']}
+    You must stay in character. Do not reveal you are an AI.
+    """
+    if use_full_backstory:
+        system_prompt += f"""
+        == SECRET KNOWLEDGE: YOUR BACKSTORY ==
+        Your Bio: {persona_data['biography_summary']}
+        Your Defining Moment: {persona_data['defining_moment']}
+        """
+    return system_prompt + "\n---\n" + prompt
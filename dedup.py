@@ -0,0 +1,90 @@
+import hashlib
+import re
+from collections import OrderedDict
+
+# --- DUPLICATE DETECTION ---
+# Each thread keeps an exact hash of every comment plus a 64-bit SimHash. The
+# SimHash is split into bands for an LSH lookup, so a new comment is compared
+# only with comments that share at least one band, never with the whole thread.
+
+SIMHASH_BITS = 64
+BANDS = 8                   # 8 bands of 8 bits: any two hashes within 7 bits share a band
+BAND_BITS = SIMHASH_BITS // BANDS
+MAX_DISTANCE = 7            # Hamming distance at or below which two comments count as near-duplicates
+MAX_THREADS = 256           # thread indexes kept in memory, least recently used evicted first
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', str(text).lower()))
+
+def content_hash(text):
+    return hashlib.sha1(normalize(text).encode()).hexdigest()
+
+def simhash(text):
+    """64-bit SimHash over words. Comments are short, so single words keep a one-word
+    edit within a few bits where longer shingles would flip a dozen."""
+    totals = [0] * SIMHASH_BITS
+    for word in normalize(text).split():
+        h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            totals[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, total in enumerate(totals) if total > 0)
+
+def bands(signature):
+    mask = (1 << BAND_BITS) - 1
+    return [(i, signature >> (i * BAND_BITS) & mask) for i in range(BANDS)]
+
+
+class ThreadIndex:
+    def __init__(self):
+        self.exact = {}         # content hash -> id
+        self.buckets = {}       # (band number, band value) -> [(id, signature)]
+
+    def find(self, text, max_distance=MAX_DISTANCE):
+        exact = self.exact.get(content_hash(text))
+        if exact is not None: return ('exact', exact)
+        signature = simhash(text)
+        for key in bands(signature):
+            for other_id, other in self.buckets.get(key, ()):
+                if bin(signature ^ other).count('1') <= max_distance:
+                    return ('near', other_id)
+        return None
+
+    def add(self, item_id, text):
+        self.exact.setdefault(content_hash(text), item_id)
+        signature = simhash(text)
+        for key in bands(signature):
+            self.buckets.setdefault(key, []).append((item_id, signature))
+
+
+class ContentDeduper:
+    """Per-thread duplicate checks, loading a thread's existing comments on first use."""
+    def __init__(self, storage, max_distance=MAX_DISTANCE, max_threads=MAX_THREADS):
+        self.storage = storage
+        self.max_distance = max_distance
+        self.max_threads = max_threads
+        self._threads = OrderedDict()
+        self.stats = {'checked': 0, 'exact': 0, 'near': 0}
+
+    def _thread(self, post_id):
+        index = self._threads.get(post_id)
+        if index is None:
+            index = ThreadIndex()
+            for comment in self.storage.get_comments_for_post(post_id):
+                index.add(comment['id'], comment['content'])
+            self._threads[post_id] = index
+            if len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        else:
+            self._threads.move_to_end(post_id)
+        return index
+
+    def check(self, post_id, content):
+        """Returns ('exact' | 'near', id of the earlier comment) or None if `content` is new."""
+        self.stats['checked'] += 1
+        match = self._thread(post_id).find(content, self.max_distance)
+        if match: self.stats[match[0]] += 1
+        return match
+
+    def remember(self, post_id, comment_id, content):
+        self._thread(post_id).add(comment_id, content)
@@ -1,75 +1,195 @@
-import sqlite3
+import argparse
 import time
 import random
 import json
-import os
+import uuid
 import dotenv
 dotenv.load_dotenv()
 
-from mainr import load_persona, get_ai_response
+from config import config, add_arguments, describe as describe_config
+from admission import controller, PRIORITY_NOTIFICATION, PRIORITY_POST, PRIORITY_SCROLL, PRIORITY_INIT
+from core import load_persona
+from mainr import get_ai_response
+from router import TASK_TITLE, TASK_POST, TASK_REPLY
+from dedup import ContentDeduper
+from fairness import FairScheduler
+from journal import WriteAheadJournal
+from profiling import Profiler
+from relationships import RelationshipMatrix
+from selection import SelectionEngine, STYLE, TACTIC
+from storage import get_storage
+from summaries import ThreadSummarizer
+from topics import TopicScheduler
 
 # --- MASTER CONFIGURATION ---
-PARTICIPANTS = ["helios", "nyx", "jax", "glitch"] 
-TACTIC_COOLDOWN = 2
-STYLE_COOLDOWN = 1
+# Tunables live in config.py ('engine.*' and 'timing.*'). They are read where they
+# are used, so editing genesis.json changes a running engine from the next cycle.
 
-# --- DATABASE HELPER FUNCTIONS ---
-# ... (execute_query, add_post_to_db are unchanged) ...
-def execute_query(query, params=(), fetch=None):
-    try:
-        db_path = os.path.join(os.path.dirname(__file__), 'world.db')
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        if fetch == 'one': result = cursor.fetchone()
-        elif fetch == 'all': result = cursor.fetchall()
-        else:
-            conn.commit()
-            result = cursor.lastrowid
-        conn.close()
-        return result
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
+def pause(low, high=None):
+    """Sleeps for `low` seconds, or a random time between `low` and `high`. The
+    max_speed preset sets every pause to zero."""
+    seconds = low if high is None else random.uniform(low, max(low, high))
+    if seconds > 0: time.sleep(seconds)
+
+# --- STORAGE ---
+# The engine talks to whichever backend is selected at start (see storage.py).
+storage = get_storage(config['db.storage'])
+deduper = ContentDeduper(storage)
+summarizer = ThreadSummarizer(storage)
+
+def use_storage(kind='sqlite', **kwargs):
+    """Switches the engine to another storage backend ('sqlite' or 'memory')."""
+    global storage, deduper, summarizer
+    storage.close()
+    storage = get_storage(kind, **kwargs)
+    deduper = ContentDeduper(storage)
+    summarizer = ThreadSummarizer(storage)
+    return storage
+
+# --- WRITE-AHEAD JOURNAL ---
+# Opened in engine_loop for SQLite storage: generated posts and comments are journaled
+# before they are stored, and anything not yet stored is retried (see journal.py).
+journal = None
+
+def write_key(kind, author):
+    return f"{kind}:{author}:{uuid.uuid4().hex}"
+
+def notification_key(author, comment_id):
+    """The same for every attempt to answer one notification, so it is answered once."""
+    return f"reply:{author}:{comment_id}"
+
+def apply_entry(entry):
+    """Stores one journaled write. Returns the new row id, or None if a comment was rejected
+    as a repeat or the write failed (a journaled write then stays pending)."""
+    kind, fields = entry['kind'], entry['fields']
+    if kind == 'comment':
+        duplicate = deduper.check(fields['post_id'], fields['content'])
+        if duplicate:
+            print(f"-> Rejected {duplicate[0]} duplicate of comment {duplicate[1]} on post {fields['post_id']}.")
+            kind = None         # the notification it answers is still marked read
+    result = storage.apply_write(entry['key'], kind, fields, entry['mark_read'])
+    if result is None:
+        if journal is not None: journal.failed(entry['key'])
         return None
-def add_post_to_db(subreddit, author, title, content):
-    query = "INSERT INTO posts (subreddit, author_name, title, content) VALUES (?, ?, ?, ?)"
-    return execute_query(query, (subreddit, author, title, content))
-# UPDATED: Now includes parent_comment_id
-def add_comment_to_db(post_id, author, content, parent_comment_id=None):
-    query = "INSERT INTO comments (post_id, author_name, content, parent_comment_id) VALUES (?, ?, ?, ?)"
-    return execute_query(query, (post_id, author, content, parent_comment_id))
+    row_id, applied_now = result
+    if applied_now and kind == 'comment' and row_id is not None:
+        deduper.remember(fields['post_id'], row_id, fields['content'])
+        summarizer.add_comment(fields['post_id'], row_id, fields['author_name'], fields['content'], fields['parent_comment_id'])
+    if journal is not None: journal.complete(entry['key'])
+    return row_id if kind else None
+
+def commit_write(key, kind, fields, mark_read=None):
+    if journal is not None:
+        entry = journal.append(key, kind, fields, mark_read)
+    else:
+        entry = {'key': key, 'kind': kind, 'fields': fields, 'mark_read': mark_read}
+    return apply_entry(entry)
+
+def retry_pending_writes():
+    """Stores journaled writes left over from a failure or an earlier run. Returns how many were tried."""
+    if journal is None: return 0
+    pending = journal.pending()
+    for entry in pending:
+        apply_entry(entry)
+    return len(pending)
+
+# --- DATABASE HELPER FUNCTIONS ---
+def add_post_to_db(subreddit, author, title, content, topic=None, key=None):
+    fields = {'subreddit': subreddit, 'author_name': author, 'title': title, 'content': content, 'topic': topic}
+    return commit_write(key or write_key('post', author), 'post', fields)
+
+def add_comment_to_db(post_id, author, content, parent_comment_id=None, key=None, mark_read=None):
+    """Stores a comment unless the thread already holds the same, or nearly the same, text.
+    `mark_read` is a notification marked read together with it, even if it is rejected."""
+    fields = {'post_id': post_id, 'author_name': author, 'content': content, 'parent_comment_id': parent_comment_id}
+    return commit_write(key or write_key('comment', author), 'comment', fields, mark_read)
 
 def mark_comment_as_read(comment_id):
-    query = "UPDATE comments SET is_read = 1 WHERE id = ?"
-    execute_query(query, (comment_id,))
+    storage.mark_comment_as_read(comment_id)
 
-# UPGRADED: This query now allows AIs to re-engage with threads.
 def get_posts_for_scrolling(persona):
     """Gets recent posts from subreddits the persona is interested in."""
-    interests = persona.get('scrolling_interests', [])
-    if not interests: return []
-    placeholders = ', '.join('?' for _ in interests)
-    query = f"SELECT id, author_name, title, content FROM posts WHERE subreddit IN ({placeholders}) AND author_name != ? ORDER BY timestamp DESC LIMIT 10"
-    return execute_query(query, tuple(interests + [persona['name']]), fetch='all')
+    return storage.get_feed(persona.get('scrolling_interests', []), persona['name'], limit=10)
 
-# UPGRADED: This function now checks for unread comments.
 def check_for_notifications(persona):
     """Gets the most recent UNREAD comment on one of the persona's posts."""
-    query = """
-        SELECT c.id, c.content, c.author_name, p.id as post_id, p.title
-        FROM comments c JOIN posts p ON c.post_id = p.id
-        WHERE p.author_name = ? AND c.author_name != ? AND c.is_read = 0
-        ORDER BY c.timestamp DESC LIMIT 1
-    """
-    return execute_query(query, (persona['name'], persona['name']), fetch='one')
-
-# NEW: Function to get comments on a post to enable replies
+    return storage.get_unread_notification(persona['name'])
+
 def get_comments_on_post(post_id):
-    query = "SELECT id, author_name, content FROM comments WHERE post_id = ? ORDER BY timestamp DESC LIMIT 10"
-    return execute_query(query, (post_id,), fetch='all')
+    return storage.get_recent_comments(post_id, limit=10)
+
+def thread_context(post_id):
+    """The thread's summary as a prompt line; the same size however long the thread is."""
+    summary = summarizer.context(post_id)
+    return f"Thread so far: {summary}\n" if summary else ""
+
+# --- RELATIONSHIPS AND TOPICS ---
+# Loaded in engine_loop; None means every choice stays uniformly random.
+relationships = None
+topic_scheduler = None
+
+def choose_by_affinity(persona_name, candidates):
+    """Picks a post or comment, leaning toward authors the persona likes."""
+    if relationships is None:
+        return random.choice(candidates)
+    return relationships.choose(persona_name, candidates, lambda row: row['author_name'])
+
+# --- STYLES AND TACTICS ---
+# Loaded in engine_loop; cooldowns ('engine.style_cooldown', 'engine.tactic_cooldown')
+# survive restarts through storage.
+selection = None
 
-def take_turn(current_persona, tactic_history, style_history):
+def choose_style_and_tactic(persona):
+    if selection is None:
+        return random.choice(persona['reply_style_preference']), random.choice(persona['possible_tactics'])
+    selection.set_cooldowns(config['engine.style_cooldown'], config['engine.tactic_cooldown'])
+    style = selection.choose(persona['name'], STYLE)
+    tactic = selection.choose(persona['name'], TACTIC)
+    selection.flush(storage)
+    return style, tactic
+
+def record_reply(persona_name, target_author, tactic):
+    if relationships is None: return
+    relationships.record_reply(persona_name, target_author, tactic)
+    relationships.flush(storage)
+
+# --- GENERATION ---
+# Set in engine_loop; every model call made for a persona is charged to its share.
+fair_scheduler = None
+
+def ask_model(persona, prompt, priority, task=TASK_REPLY):
+    if fair_scheduler is not None:
+        fair_scheduler.charge(persona['name'])
+    return get_ai_response(persona, prompt, priority=priority, task=task)
+
+REGENERATE_HINT = "\n- Your first draft repeated something already said in this thread. Say something new."
+
+def generate_comment(persona, prompt, post_id, priority):
+    """Asks for a comment, and asks once more if the first draft repeats the thread."""
+    content = ask_model(persona, prompt, priority)
+    if content is not None and deduper.check(post_id, content):
+        print(f"  ({persona['name']}'s draft repeats the thread, regenerating)")
+        content = ask_model(persona, prompt + REGENERATE_HINT, priority)
+    return content
+
+def create_post(persona):
+    """Starts a new thread in the persona's home subreddit. Returns True if it was posted."""
+    home_sub = persona['home_subreddit']
+    topic = topic_scheduler.pick(home_sub)['topic']
+    print(f"-> {persona['name']} starts a new thread in {home_sub} about '{topic}'.")
+    post_title = ask_model(persona, f"Generate a short, catchy title for a post about '{topic}'.", PRIORITY_POST, task=TASK_TITLE)
+    if post_title is None: return False
+    post_content = ask_model(persona, f"You are making a post in '{home_sub}' about '{topic}'. Write a concise post.", PRIORITY_POST, task=TASK_POST)
+    if post_content is None: return False
+    add_post_to_db(home_sub, persona['name'], post_title, post_content, topic)
+    print(f"-> {persona['name']} posted in {home_sub}: '{post_title}'")
+    return True
+
+def wants_to_post(persona):
+    if topic_scheduler is None or not persona.get('home_subreddit'): return False
+    return random.random() < persona.get('post_vs_comment_ratio', 0)
+
+def take_turn(current_persona):
     """Contains the full logic for a single persona's turn."""
     persona_name = current_persona['name']
     print(f"\n--- Tick! {persona_name} wakes up. ---")
@@ -78,28 +198,45 @@ def take_turn(current_persona, tactic_history, style_history):
     
     # NOTIFICATION CHECK
     notification = check_for_notifications(current_persona)
-    if notification and random.random() < 0.9:
-        action_taken = True
-        # ... (rest of your existing notification logic)
+    is_active = random.random() < current_persona.get('activity_level', 0.5)
+    if notification and random.random() < config['engine.notification_reply_chance']:
         comment_id, comment_content, commenter_name, post_id, post_title = notification
         print(f"-> {persona_name} sees a new notification from {commenter_name} on their post '{post_title}'.")
-        chosen_style = random.choice(current_persona['reply_style_preference'])
-        chosen_tactic = random.choice(current_persona['possible_tactics'])
-        print(f"  (Style: {chosen_style}, Tactic: {chosen_tactic})")
-        prompt = f"You are replying to a comment on your post. The comment is: '{comment_content}'.\nYour Task: Write a reply using style '{chosen_style}' and tactic '{chosen_tactic}'."
-        reply_content = get_ai_response(current_persona, prompt)
-        add_comment_to_db(post_id, persona_name, reply_content)
-        mark_comment_as_read(comment_id)
-        print(f"-> {persona_name} replied to {commenter_name}.")
-        time.sleep(1)
+        key = notification_key(persona_name, comment_id)
+        written = journal.get(key) if journal is not None else None
+        if written is not None:
+            # Answered before but never stored: store that answer instead of generating another
+            print(f"-> {persona_name} already wrote a reply to {commenter_name}; storing it.")
+            action_taken = True
+            if apply_entry(written) is not None:
+                print(f"-> {persona_name} replied to {commenter_name}.")
+        else:
+            chosen_style, chosen_tactic = choose_style_and_tactic(current_persona)
+            print(f"  (Style: {chosen_style}, Tactic: {chosen_tactic})")
+            prompt = f"{thread_context(post_id)}You are replying to a comment on your post. The comment is: '{comment_content}'.\nYour Task: Write a reply using style '{chosen_style}' and tactic '{chosen_tactic}'."
+            reply_content = generate_comment(current_persona, prompt, post_id, PRIORITY_NOTIFICATION)
+            # Left unread on failure so the notification is picked up again next turn
+            if reply_content is not None:
+                action_taken = True
+                # Marked read with the reply, even when the reply is rejected as a repeat
+                if add_comment_to_db(post_id, persona_name, reply_content, parent_comment_id=comment_id,
+                                     key=key, mark_read=comment_id) is not None:
+                    record_reply(persona_name, commenter_name, chosen_tactic)
+                    print(f"-> {persona_name} replied to {commenter_name}.")
+                pause(config['timing.action_pause'])
         
+    # NEW POST LOGIC
+    elif is_active and wants_to_post(current_persona):
+        action_taken = create_post(current_persona)
+        if action_taken: pause(config['timing.action_pause'])
+
     # SCROLLING LOGIC
-    elif random.random() < current_persona.get('activity_level', 0.5):
+    elif is_active:
         print(f"-> {persona_name} decides to scroll...")
         posts_to_scroll = get_posts_for_scrolling(current_persona)
         if posts_to_scroll:
             action_taken = True
-            post_to_read = random.choice(posts_to_scroll)
+            post_to_read = choose_by_affinity(persona_name, posts_to_scroll)
             post_id, author, title, content = post_to_read
             print(f"-> {persona_name} is reading '{title}' by {author}.")
             
@@ -107,10 +244,10 @@ def take_turn(current_persona, tactic_history, style_history):
             comments_on_post = get_comments_on_post(post_id)
             reply_target = None
             # Determine whether to reply to a comment or the main post
-            if random.random() < 0.8:  # 80% chance to reply to a comment
-                # 70% chance to reply to a comment if there are comments
-                if comments_on_post and random.random() < 0.8:
-                    target_comment = random.choice(comments_on_post)
+            if random.random() < config['engine.reply_chance']:
+                # Reply to a comment, if there are any, or else to the post
+                if comments_on_post and random.random() < config['engine.comment_target_chance']:
+                    target_comment = choose_by_affinity(persona_name, comments_on_post)
                     if target_comment['author_name'] != persona_name:
                         reply_target = 'comment'
                         target_id, target_author, target_content = target_comment['id'], target_comment['author_name'], target_comment['content']
@@ -121,66 +258,139 @@ def take_turn(current_persona, tactic_history, style_history):
                     print(f"  -> Decides to reply to the main post by {author}.")
 
                 if reply_target:
-                    chosen_style = random.choice(current_persona['reply_style_preference'])
-                    chosen_tactic = random.choice(current_persona['possible_tactics'])
+                    chosen_style, chosen_tactic = choose_style_and_tactic(current_persona)
                     print(f"  (Style: {chosen_style}, Tactic: {chosen_tactic})")
-                    prompt = f"You are in a thread titled '{title}'. You are replying to a {reply_target} from {target_author} that says: '{target_content}'.\nYour Task: Write a direct reply using style '{chosen_style}' and tactic '{chosen_tactic}'."
-                    comment_content = get_ai_response(current_persona, prompt)
-                    
-                    if reply_target == 'post':
-                        add_comment_to_db(post_id, persona_name, comment_content)
+                    prompt = f"You are in a thread titled '{title}'. {thread_context(post_id)}You are replying to a {reply_target} from {target_author} that says: '{target_content}'.\nYour Task: Write a direct reply using style '{chosen_style}' and tactic '{chosen_tactic}'."
+                    comment_content = generate_comment(current_persona, prompt, post_id, PRIORITY_SCROLL)
+                    if comment_content is None:
+                        print(f"-> {persona_name} gives up on replying.")
                     else:
-                        add_comment_to_db(post_id, persona_name, comment_content, parent_comment_id=target_id)
-                    
-                    print(f"-> {persona_name} posted a reply in the thread.")
-                    time.sleep(1)
+                        parent_id = None if reply_target == 'post' else target_id
+                        if add_comment_to_db(post_id, persona_name, comment_content, parent_comment_id=parent_id) is not None:
+                            record_reply(persona_name, target_author, chosen_tactic)
+                            print(f"-> {persona_name} posted a reply in the thread.")
+                        pause(config['timing.action_pause'])
 
     if not action_taken:
         print(f"-> {persona_name} decides to lurk.")
-        time.sleep(random.randint(2, 5))
+        pause(config['timing.lurk_pause_min'], config['timing.lurk_pause_max'])
+
+# --- PROFILING ---
+# `kill -USR1 <pid>` or creating profile.on starts a profile; the same again stops it
+# and writes the reports to profiles/ (see profiling.py).
+profiler = Profiler('engine')
 
-def engine_loop():
+def engine_loop(backend=None, profile=False):
     """The main, infinite loop with the new hybrid turn system."""
-    print("Starting the autonomous engine with HYBRID turn model... Press Ctrl-C to stop.")
+    if backend and backend != storage.name:
+        use_storage(backend)
+    print(f"Starting the autonomous engine with HYBRID turn model ({storage.name} storage)... Press Ctrl-C to stop.")
+    profiler.install_signal()
+    config.install_reload_signal()
+    if profile: profiler.start()
+    if config.active_preset:
+        print(f"Using the '{config.active_preset}' settings preset.")
     
-    personas = [load_persona(name) for name in PARTICIPANTS]
+    personas = [load_persona(name) for name in config['engine.participants']]
     if not personas or any(p is None for p in personas):
         print(f"Error loading personas. Exiting."); return
     print(f"PARTICIPANTS LOADED: {[p['name'] for p in personas]}")
 
-    tactic_history = {p['name']: [] for p in personas}
-    style_history = {p['name']: "" for p in personas}
+    global relationships
+    relationships = RelationshipMatrix.from_personas(personas, storage)
+
+    global selection
+    selection = SelectionEngine.from_personas(personas, storage, config['engine.style_cooldown'], config['engine.tactic_cooldown'])
+
+    global fair_scheduler
+    fair_scheduler = FairScheduler(personas)
+    personas_by_name = {p['name']: p for p in personas}
+
+    global topic_scheduler
+    topic_scheduler = TopicScheduler(storage)
+    topic_scheduler.refresh_stats()
+    topic_scheduler.start_generator(p['home_subreddit'] for p in personas if p.get('home_subreddit'))
+
+    global journal
+    if storage.name == 'sqlite':
+        journal = WriteAheadJournal(config['db.journal_path'])
+        replayed = retry_pending_writes()
+        if replayed:
+            print(f"Replayed {replayed} journaled write(s) from the last run.")
+        journal.compact()
 
     print("\n--- INITIALIZATION ---")
     for persona in personas:
         home_sub = persona.get('home_subreddit')
         if home_sub:
-            topic = "The morality of creating sentient AI"
-            post_title = get_ai_response(persona, f"Generate a short, catchy title for a post about '{topic}'.")
-            post_content = get_ai_response(persona, f"You are making a post in '{home_sub}' about '{topic}'. Write a concise post.")
-            add_post_to_db(home_sub, persona['name'], post_title, post_content)
+            topic = topic_scheduler.pick(home_sub)['topic']
+            post_title = ask_model(persona, f"Generate a short, catchy title for a post about '{topic}'.", PRIORITY_INIT, task=TASK_TITLE)
+            post_content = ask_model(persona, f"You are making a post in '{home_sub}' about '{topic}'. Write a concise post.", PRIORITY_INIT, task=TASK_POST)
+            if post_title is None or post_content is None:
+                print(f"-> {persona['name']} could not write their first post.")
+                continue
+            add_post_to_db(home_sub, persona['name'], post_title, post_content, topic)
             print(f"-> {persona['name']} posted in {home_sub}: '{post_title}'")
-            time.sleep(1)
+            pause(config['timing.init_post_pause'])
 
     print("\n--- MAIN LOOP ---")
     while True:
         try:
-            # --- ROUND-ROBIN PHASE ---
-            print("\n" + "="*15 + " ROUND-ROBIN CYCLE " + "="*15)
+            profiler.poll()
+            config.reload_if_changed()
+            retry_pending_writes()
+
+            # --- THREAD LIFECYCLE ---
+            archived = storage.archive_stale_threads(config['engine.thread_max_age'], config['engine.thread_max_comments'])
+            if archived:
+                print(f"\n[Archived {archived} thread(s) that aged out of the feeds]")
+
+            # --- FAIR-SHARE CYCLE ---
+            # Everyone asks for a turn, plus one surprise turn; turns are served in fair-share
+            # order and a persona that has spent its model-call quota sits the cycle out.
+            print("\n" + "="*15 + " FAIR-SHARE CYCLE " + "="*15)
             for current_persona in personas:
-                take_turn(current_persona, tactic_history, style_history)
-                time.sleep(random.randint(2, 5))
+                fair_scheduler.submit(current_persona['name'])
+            fair_scheduler.submit(random.choice(personas)['name'], 'surprise')
+            served = 0
+            while True:
+                picked = fair_scheduler.next()
+                if picked is None: break
+                served += 1
+                name, action = picked
+                if action == 'surprise':
+                    print(f"--- {name} gets a surprise turn! ---")
+                take_turn(personas_by_name[name])
+                pause(config['timing.turn_pause_min'], config['timing.turn_pause_max'])
+            if not served:
+                wait = fair_scheduler.wait_time()
+                print(f"-> Everyone is over their model-call quota; waiting {wait:.0f}s.")
+                time.sleep(wait)
 
-            # --- RANDOM ROLL PHASE ---
-            print("\n" + "="*15 + " RANDOM ROLL CYCLE " + "="*15)
-            random_persona = random.choice(personas)
-            print(f"--- {random_persona['name']} gets a surprise turn! ---")
-            take_turn(random_persona, tactic_history, style_history)
-            time.sleep(random.randint(1, 3))
+            llm = controller.metrics()
+            print(f"[LLM] queue={llm['queue_depth']} in_flight={llm['in_flight']} circuit={llm['circuit']} "
+                  f"shed={llm['shed']} failures={llm['failures']} avg_wait={llm['wait_avg']:.2f}s")
+            print("[QUOTA] " + " ".join(f"{name}: turns={q['turns']} calls={q['calls']} throttled={q['throttled']} tokens={q['tokens']}"
+                                        for name, q in fair_scheduler.metrics().items()))
 
         except KeyboardInterrupt:
+            profiler.stop()
+            if journal is not None: journal.close()
             print("\nEngine shutting down. Goodbye!")
             break
 
 if __name__ == "__main__":
-    engine_loop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the autonomous AI society engine.")
+    parser.add_argument('--storage', choices=['sqlite', 'memory'], default=None,
+                        help="Storage backend (default: db.storage, i.e. $GENESIS_STORAGE or sqlite).")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile from the start; reports are written to profiles/ on SIGUSR1 or Ctrl-C.")
+    add_arguments(parser)
+    parser.add_argument('--show-config', action='store_true', help="Print every setting and exit.")
+    args = parser.parse_args()
+    config.apply_cli(args.config, args.preset, args.set)
+    controller.configure()
+    if args.show_config:
+        print(describe_config())
+    else:
+        engine_loop(backend=args.storage or config['db.storage'], profile=args.profile)
\ No newline at end of file
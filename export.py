@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+
+from storage import get_storage
+
+# --- STREAMING EXPORT ---
+# Writes posts and comments to JSONL or Parquet shards for downstream pipelines.
+# Rows are read in id order, one batch at a time, so memory stays bounded by the
+# batch size and the few thread trees needed to work out each comment's depth
+# and path. The export stops at the high-water mark read when it starts, so it
+# can run while the engine writes, and that mark is saved as a watermark the
+# next run continues from.
+#
+#   <out>/posts/part-<first id>.<ext>
+#   <out>/comments/part-<first id>.<ext>
+#   <out>/watermark.json            {"post_id": ..., "comment_id": ...}
+
+BATCH_SIZE = 1000           # rows read per query
+SHARD_ROWS = 100_000        # rows per shard file
+THREAD_CACHE = 64           # thread trees kept while resolving comment paths
+WATERMARK_FILE = 'watermark.json'
+FORMATS = ('jsonl', 'parquet')
+REQUIRED_COLUMNS = {'posts': ('archived', 'created_us'), 'comments': ('created_us',)}
+
+
+# --- SHARD WRITERS ---
+class JSONLShard:
+    extension = 'jsonl'
+
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, records):
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetShard:
+    extension = 'parquet'
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow), or use --format jsonl.")
+        self.pyarrow = pyarrow
+        self.path = path
+        self.writer = None
+
+    def write(self, records):
+        if not records: return
+        table = self.pyarrow.Table.from_pylist(records)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)     # one row group per batch
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+SHARD_TYPES = {'jsonl': JSONLShard, 'parquet': ParquetShard}
+
+
+class ShardedOutput:
+    """Rolls over to a new shard every `shard_rows` rows. A shard is written under a
+    temporary name and renamed when it is complete, so readers never see half a file."""
+    def __init__(self, directory, fmt, shard_rows=SHARD_ROWS):
+        self.directory = directory
+        self.shard_type = SHARD_TYPES[fmt]
+        self.shard_rows = shard_rows
+        self.shard = None
+        self.rows_in_shard = 0
+        self.rows = 0
+        self.files = []
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, records):
+        while records:
+            if self.shard is None:
+                name = f"part-{records[0]['id']:010d}.{self.shard_type.extension}"
+                self.final_path = os.path.join(self.directory, name)
+                self.shard = self.shard_type(self.final_path + '.tmp')
+            room = self.shard_rows - self.rows_in_shard
+            chunk, records = records[:room], records[room:]
+            self.shard.write(chunk)
+            self.rows_in_shard += len(chunk)
+            self.rows += len(chunk)
+            if self.rows_in_shard >= self.shard_rows:
+                self.close()
+
+    def close(self):
+        if self.shard is None: return
+        self.shard.close()
+        os.replace(self.final_path + '.tmp', self.final_path)
+        self.files.append(self.final_path)
+        self.shard = None
+        self.rows_in_shard = 0
+
+
+# --- WATERMARK ---
+def read_watermark(out_dir):
+    try:
+        with open(os.path.join(out_dir, WATERMARK_FILE), 'r') as f:
+            mark = json.load(f)
+        return mark['post_id'], mark['comment_id']
+    except FileNotFoundError:
+        return 0, 0
+
+def write_watermark(out_dir, post_id, comment_id):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'post_id': post_id, 'comment_id': comment_id, 'exported_at': time.time()}, f)
+    os.replace(path + '.tmp', path)
+
+
+# --- RECORDS ---
+def post_record(post):
+    return {'id': post['id'], 'subreddit': post['subreddit'], 'author': post['author_name'],
+            'title': post['title'], 'content': post['content'], 'timestamp': post['timestamp'],
+            'created_us': post['created_us'], 'archived': bool(post['archived'])}
+
+
+class ThreadPaths:
+    """Depth and path (top-level comment id down to the comment) for comments, one thread at a time."""
+    def __init__(self, storage, max_threads=THREAD_CACHE):
+        self.storage = storage
+        self.max_threads = max_threads
+        self._threads = OrderedDict()      # post_id -> {comment_id: parent_comment_id}
+
+    def _parents(self, post_id, comment_id):
+        parents = self._threads.get(post_id)
+        if parents is None or comment_id not in parents:
+            parents = self.storage.get_comment_parents(post_id)
+            self._threads[post_id] = parents
+            if len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        else:
+            self._threads.move_to_end(post_id)
+        return parents
+
+    def path(self, post_id, comment_id):
+        parents = self._parents(post_id, comment_id)
+        path, node = [], comment_id
+        while node is not None and node not in path:
+            path.append(node)
+            node = parents.get(node)
+        return path[::-1]
+
+
+def comment_record(comment, subreddit, paths):
+    path = paths.path(comment['post_id'], comment['id'])
+    return {'id': comment['id'], 'post_id': comment['post_id'], 'subreddit': subreddit,
+            'parent_id': comment['parent_comment_id'], 'author': comment['author_name'],
+            'content': comment['content'], 'timestamp': comment['timestamp'],
+            'created_us': comment['created_us'], 'depth': len(path), 'path': path}
+
+
+# --- EXPORT ---
+def missing_columns(storage):
+    """Columns the export reads that a not-yet-migrated SQLite database lacks. The
+    exporter opens databases read-only, so it can't add them itself."""
+    missing = []
+    for table, columns in REQUIRED_COLUMNS.items():
+        present = {row['name'] for row in storage.execute_query(f"PRAGMA table_info({table})", fetch='all') or []}
+        missing += [f"{table}.{column}" for column in columns if column not in present]
+    return missing
+
+def export(storage, out_dir, fmt='jsonl', since=None, batch_size=BATCH_SIZE, shard_rows=SHARD_ROWS):
+    """Exports posts and comments added after the watermark (`since`, or the one saved in
+    `out_dir`) up to the current high-water mark. Returns (posts written, comments written)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Choose one of: {', '.join(FORMATS)}")
+    os.makedirs(out_dir, exist_ok=True)
+    post_mark, comment_mark = since if since is not None else read_watermark(out_dir)
+    post_high, comment_high = storage.get_high_water()
+
+    posts_out = ShardedOutput(os.path.join(out_dir, 'posts'), fmt, shard_rows)
+    comments_out = ShardedOutput(os.path.join(out_dir, 'comments'), fmt, shard_rows)
+    try:
+        cursor = post_mark
+        while cursor < post_high:
+            batch = storage.get_posts_after(cursor, batch_size, until_id=post_high)
+            if not batch: break
+            posts_out.write([post_record(p) for p in batch])
+            cursor = batch[-1]['id']
+        posts_out.close()
+
+        paths = ThreadPaths(storage)
+        subreddits = {}
+        cursor = comment_mark
+        while cursor < comment_high:
+            batch = storage.get_comments_after(cursor, batch_size, until_id=comment_high)
+            if not batch: break
+            for post_id in {c['post_id'] for c in batch} - subreddits.keys():
+                post = storage.get_post(post_id)
+                subreddits[post_id] = post['subreddit'] if post else None
+            comments_out.write([comment_record(c, subreddits[c['post_id']], paths) for c in batch])
+            cursor = batch[-1]['id']
+            if len(subreddits) > THREAD_CACHE * 16: subreddits.clear()
+        comments_out.close()
+    except BaseException:
+        # Leave the watermark alone: the next run redoes this range
+        for output in (posts_out, comments_out):
+            if output.shard is not None:
+                output.shard.close()
+                os.remove(output.final_path + '.tmp')
+        raise
+
+    write_watermark(out_dir, max(post_high, post_mark), max(comment_high, comment_mark))
+    return posts_out.rows, comments_out.rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export posts and comments as JSONL or Parquet shards.")
+    parser.add_argument('--out', default='exports', help="Output directory (default: exports).")
+    parser.add_argument('--format', choices=FORMATS, default='jsonl')
+    parser.add_argument('--db', default=None, help="SQLite database to export (default: world.db).")
+    parser.add_argument('--full', action='store_true', help="Ignore the saved watermark and export everything (use an empty --out).")
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE, help=f"Rows per query (default: {BATCH_SIZE}).")
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS, help=f"Rows per shard (default: {SHARD_ROWS}).")
+    args = parser.parse_args()
+
+    storage = get_storage('readonly', db_path=args.db)      # never creates or migrates the engine's database
+    started = time.perf_counter()
+    try:
+        if not os.path.exists(storage.db_path):
+            raise RuntimeError(f"no database at {storage.db_path}")
+        missing = missing_columns(storage)
+        if missing:
+            raise RuntimeError(f"the database lacks {', '.join(missing)}; run the engine or the viewer "
+                               f"on it once to upgrade it")
+        posts, comments = export(storage, args.out, args.format, since=(0, 0) if args.full else None,
+                                 batch_size=args.batch, shard_rows=args.shard_rows)
+        print(f"Exported {posts} posts and {comments} comments to {args.out} in {time.perf_counter() - started:.1f}s.")
+    except RuntimeError as e:
+        print(f"Export failed: {e}")
+    finally:
+        storage.close()
@@ -0,0 +1,96 @@
+import heapq
+import itertools
+import threading
+import time
+
+from config import config
+
+# --- FAIR-SHARE TURN SCHEDULING ---
+# Each persona gets a token bucket of model calls that refills in proportion to
+# its activity_level, and pending turns are served in weighted fair queuing
+# order: a persona's turns are tagged with the model calls it has already
+# used divided by its weight, so a chatty persona drifts to the back of the
+# queue and one that runs out of tokens sits the cycle out.
+
+TURN_COST = 0.5             # virtual cost of a turn that makes no model calls (lurking)
+MIN_WEIGHT = 0.05
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate                # tokens per second
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        self._refill()
+        return self.tokens
+
+    def consume(self, amount=1):
+        """Takes `amount` tokens; the balance may go negative and must be paid back by refills."""
+        self._refill()
+        self.tokens -= amount
+
+
+class FairScheduler:
+    def __init__(self, personas, calls_per_minute=None, burst=None, clock=time.monotonic):
+        """`calls_per_minute` (at activity_level 1.0) and `burst` (calls a persona can save up;
+        one turn uses at most this many) default to scheduler.calls_per_minute and scheduler.burst."""
+        calls_per_minute = calls_per_minute if calls_per_minute is not None else config['scheduler.calls_per_minute']
+        burst = burst if burst is not None else config['scheduler.burst']
+        self.weights = {p['name']: max(MIN_WEIGHT, p.get('activity_level', 0.5)) for p in personas}
+        self.buckets = {name: TokenBucket(calls_per_minute / 60 * weight, burst, clock)
+                        for name, weight in self.weights.items()}
+        self.finish = {name: 0.0 for name in self.weights}     # virtual time each persona has used up to
+        self.virtual_time = 0.0
+        self.usage = {name: {'turns': 0, 'calls': 0, 'throttled': 0} for name in self.weights}
+        self._queue = []                # heap of (start tag, seq, name, action)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, name, action='turn'):
+        """Queues a turn for `name`, tagged by how much of its share it has already used."""
+        with self._lock:
+            start = max(self.virtual_time, self.finish[name])
+            heapq.heappush(self._queue, (start, next(self._seq), name, action))
+
+    def next(self):
+        """The (name, action) to serve next, or None when the queue is empty.
+        Turns of personas with no tokens left are dropped and counted as throttled."""
+        with self._lock:
+            while self._queue:
+                start, _, name, action = heapq.heappop(self._queue)
+                if self.buckets[name].available() < 1:
+                    self.usage[name]['throttled'] += 1
+                    continue
+                self.virtual_time = max(self.virtual_time, start)
+                self.finish[name] = max(self.finish[name], start) + TURN_COST / self.weights[name]
+                self.usage[name]['turns'] += 1
+                return name, action
+            return None
+
+    def wait_time(self):
+        """Seconds until at least one persona has a whole token again."""
+        with self._lock:
+            return min((1 - b.available()) / b.rate if b.available() < 1 else 0.0 for b in self.buckets.values())
+
+    def charge(self, name, calls=1):
+        """Accounts `calls` model calls made on behalf of `name`."""
+        with self._lock:
+            if name not in self.buckets: return
+            self.buckets[name].consume(calls)
+            self.finish[name] += calls / self.weights[name]
+            self.usage[name]['calls'] += calls
+
+    def metrics(self):
+        with self._lock:
+            return {name: {**usage, 'weight': self.weights[name],
+                           'tokens': round(self.buckets[name].available(), 2)}
+                    for name, usage in self.usage.items()}
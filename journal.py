@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+
+from clock import now_us
+
+# --- WRITE-AHEAD JOURNAL ---
+# Generated posts and comments cost a model call, so they are written here, and
+# fsync'd, before the engine stores them. Each entry has a key that names the
+# write: answering one notification always has the same key, so it is never
+# answered twice. storage.apply_write records the key in the same transaction as
+# the row, so applying an entry again after a crash is a no-op. Once stored, a
+# "done" line is appended. Entries without one are retried every cycle and
+# replayed when the engine starts.
+#
+#   {"key": ..., "kind": "comment", "fields": {...}, "mark_read": 12, "at": <µs>}
+#   {"key": ..., "done": true}          (or "abandoned": true after MAX_ATTEMPTS failures)
+
+JOURNAL_PATH = 'pending_writes.jsonl'
+MAX_ATTEMPTS = 5            # failed applies in one run before an entry is set aside
+COMPACT_AFTER = 1000        # finished entries before the file is rewritten without them
+
+
+class WriteAheadJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._pending = {}          # key -> entry, in the order written
+        self._attempts = {}
+        self._finished = 0
+        self._lock = threading.Lock()
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        if lines and not lines[-1].endswith('\n'):
+            # A crash mid-append leaves a torn last line. It was never acknowledged, so it
+            # is cut off here rather than left for the next append to run into.
+            torn = lines.pop()
+            with open(self.path, 'r+b') as f:
+                f.truncate(os.path.getsize(self.path) - len(torn.encode('utf-8')))
+        for number, line in enumerate(lines, 1):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"Journal error: skipping unreadable line {number} of {self.path}")
+                continue
+            if entry.get('done') or entry.get('abandoned'):
+                self._pending.pop(entry['key'], None)
+                self._finished += 1
+            else:
+                self._pending[entry['key']] = entry
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, key, kind, fields, mark_read=None):
+        """Durably records a write before it is applied. Returns the entry."""
+        entry = {'key': key, 'kind': kind, 'fields': fields, 'mark_read': mark_read, 'at': now_us()}
+        with self._lock:
+            self._write(entry)
+            self._pending[key] = entry
+        return entry
+
+    def complete(self, key):
+        with self._lock:
+            if self._pending.pop(key, None) is None: return
+            self._attempts.pop(key, None)
+            self._write({'key': key, 'done': True})
+            self._finished += 1
+        if self._finished >= COMPACT_AFTER:
+            self.compact()
+
+    def failed(self, key):
+        """Counts a failed apply. Returns True once the entry has been set aside for good."""
+        with self._lock:
+            self._attempts[key] = self._attempts.get(key, 0) + 1
+            if self._attempts[key] < MAX_ATTEMPTS: return False
+            entry = self._pending.pop(key, None)
+            if entry is None: return True
+            self._write({'key': key, 'abandoned': True})
+            self._finished += 1
+        print(f"Journal: giving up on {key} after {MAX_ATTEMPTS} failed attempts; "
+              f"its content is kept in {self.path} until the next compaction.")
+        return True
+
+    def get(self, key):
+        with self._lock:
+            return self._pending.get(key)
+
+    def pending(self):
+        """Unfinished entries, oldest first."""
+        with self._lock:
+            return list(self._pending.values())
+
+    def compact(self):
+        """Rewrites the file with only the unfinished entries."""
+        with self._lock:
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for entry in self._pending.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._finished = 0
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -1,164 +1,115 @@
-import json
 import os
-import time
-import random
-import dotenv
+import threading
 
-dotenv.load_dotenv()
-
-# --- MASTER CONFIGURATION ---
-PARTICIPANTS = ["jax", "kaelen"]
-NUM_TURNS = 5
-TACTIC_COOLDOWN = 2
+from config import config, add_arguments, describe as describe_config
+from admission import controller, AdmissionRejected, PRIORITY_SCROLL
+from core import load_persona, build_prompt  # load_persona is re-exported for older callers
+from router import ModelRouter, GenAIBackend, HTTPBackend, LocalBackend, ReplayBackend, RateLimited, TASK_CHOICE, TASK_TITLE, TASK_REPLY
 
 # --- SDK & MODEL CONFIGURATION ---
-try:
-    import google.generativeai as genai
-    API_KEY = os.environ.get('GENAI_API_KEY')
-    if API_KEY:
-        genai.configure(api_key=API_KEY)
-        model = genai.GenerativeModel('gemini-2.5-flash-lite')
-    else:
-        model = None
-except ImportError:
-    genai = None
-    model = None
+# Nothing here runs at import time: .env, the SDK and the model clients are loaded
+# by the first get_router() call, so importing mainr stays cheap for viewers.
+router = None
+model = None
+genai = None
+_router_lock = threading.Lock()
 
-if model is None:
-    print("WARNING: Using a local dummy model.")
-    class _DummyResponse:
-        def __init__(self, text): self.text = text
-    class _DummyModel:
-        def generate_content(self, prompt):
-            return _DummyResponse("This is a simplified, direct simulated reply.")
-    model = _DummyModel()
+def get_router():
+    """Builds the model router on first use and returns the same one afterwards."""
+    global router, model, genai
+    if router is not None: return router
+    with _router_lock:
+        if router is not None: return router
+        import dotenv
+        dotenv.load_dotenv()
+        config.load()           # .env may set GENESIS_MODEL and friends
+        model_name = config['model.name']
+        fast_model_name = config['model.fast_name']                 # optional cheaper model for choices and titles
+        replay_path = os.environ.get('GENESIS_REPLAY_PATH')         # optional JSONL cache of earlier answers
+        mock_url = os.environ.get('GENESIS_MOCK_URL')               # optional mock model server (mockllm.py)
 
-# --- CORE FUNCTIONS ---
-def load_persona(persona_name):
-    """Loads a persona JSON file from the 'personas' folder."""
-    try:
-        with open(os.path.join('personas', f'{persona_name}.json'), 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Persona file for '{persona_name}' not found.")
-        return None
+        new_router = ModelRouter()
+        try:
+            import google.generativeai as genai
+            api_key = os.environ.get('GENAI_API_KEY')
+            if api_key:
+                genai.configure(api_key=api_key)
+                model = genai.GenerativeModel(model_name)
+                new_router.register(GenAIBackend(model, model_name))
+                if fast_model_name:
+                    new_router.register(GenAIBackend(genai.GenerativeModel(fast_model_name), fast_model_name),
+                                        tasks=(TASK_CHOICE, TASK_TITLE))
+        except ImportError:
+            genai = None
 
-def get_ai_response(persona_data, prompt, use_full_backstory=False):
-    """Generates a response from the AI, embodying the given persona."""
-    system_prompt = f"""
-    You are a human being in an online discussion.
-    Your identity:
-    - Name: {persona_data['name']}
-    - Archetype: {persona_data['archetype']}
-    - From: {persona_data['demographics']['location']}
-    - Voice: {persona_data['speech_patterns']}
-    You must stay in character. Do not reveal you are an AI.
-    """
-    if use_full_backstory:
-        system_prompt += f"""
-        == SECRET KNOWLEDGE: YOUR BACKSTORY ==
-        Your Bio: {persona_data['biography_summary']}
-        Your Defining Moment: {persona_data['defining_moment']}
-        """
-    full_prompt = system_prompt + "\n---\n" + prompt
-    try:
-        response = model.generate_content(full_prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"[Error: {e}]"
+        if replay_path:
+            new_router.register(ReplayBackend(replay_path, record=os.environ.get('GENESIS_RECORD_REPLAY') == '1'))
 
-def run_simulation():
-    """The main engine that runs the entire conversation simulation."""
-    print("--- INITIALIZING SIMULATION PLATFORM ---")
-    
-    # MODERATOR: RANDOMLY SELECT A TOPIC
-    try:
-        with open('topics.json', 'r') as f:
-            topic_data = random.choice(json.load(f))
-        subreddit = topic_data['subreddit']
-        topic = topic_data['topic']
-        print(f"MODERATOR: Today's discussion will be in '{subreddit}' on the topic: '{topic}'")
-    except Exception as e:
-        print(f"Error loading topics: {e}"); return
+        if mock_url:
+            new_router.register(HTTPBackend(mock_url, 'mock', stream=os.environ.get('GENESIS_MOCK_STREAM') == '1'))
 
-    # LOAD PARTICIPANTS DYNAMICALLY
-    personas = [load_persona(name) for name in PARTICIPANTS]
-    if any(p is None for p in personas):
-        print(f"Error: Could not load one or more personas. Aborting.")
-        return
-    print(f"PARTICIPANTS LOADED: {[p['name'] for p in personas]}\n")
-    
-    tactic_history = {p['name']: [] for p in personas}
-    
-    print("--- SIMULATION START ---")
-    print(f"Subreddit: {subreddit}\nTopic: {topic}\n")
+        if model is None and not mock_url:
+            print("WARNING: Using a local dummy model.")
+            new_router.register(LocalBackend('dummy'))
+        router = new_router
+        return router
 
-    # RANDOMLY SELECT FIRST POSTER
-    first_poster = random.choice(personas)
-    post_prompt = f"You are starting a new thread in {subreddit} on the topic: '{topic}'. Write a concise opening post."
-    initial_post = get_ai_response(first_poster, post_prompt, use_full_backstory=True)
-    print(f"[POST by {first_poster['name']}]: {initial_post}\n")
-    
-    conversation_thread = [f"[POST by {first_poster['name']}]: {initial_post}"]
-    
-    # DYNAMIC TURN-TAKING LOOP
-    turn_index = personas.index(first_poster)
-    for _ in range(NUM_TURNS * len(personas)):
-        print("-" * 20)
-        time.sleep(1)
-        
-        turn_index = (turn_index + 1) % len(personas)
-        current_commenter_persona = personas[turn_index]
-        persona_name = current_commenter_persona['name']
-        
-        # --- UPDATED: THE FINAL 50/50 "SMART" LOGIC ---
-
-        # STEP 1: CHOOSE REPLY STYLE (50% Logical, 50% Impulsive)
-        if random.random() < 0.5: # 50% chance for an impulsive choice
-            chosen_style = random.choice(current_commenter_persona['reply_style_preference'])
-            print(f"<{persona_name} impulsively chooses style: {chosen_style}>")
-        else: # 50% chance for a logical, "smart" choice
-            last_message = conversation_thread[-1]
-            # This is the new, safer "Forced Choice" prompt
-            style_prompt = f"Given the last comment was: \"{last_message[:200]}...\"\nWhich of these reply styles is the most logical choice for you? {current_commenter_persona['reply_style_preference']}\nJust simply choose ONE option from the list, no need to explain why."
-            chosen_style = get_ai_response(current_commenter_persona, style_prompt, use_full_backstory=False)
-            print(f"<{persona_name} logically chooses style: {chosen_style}>")
-
-        # STEP 2: CHOOSE TACTIC (50% Logical, 50% Impulsive)
-        unavailable_tactics = tactic_history[persona_name]
-        available_tactics = [t for t in current_commenter_persona['possible_tactics'] if t not in unavailable_tactics]
-        if not available_tactics: available_tactics = current_commenter_persona['possible_tactics']
-
-        if random.random() < 0.5: # 50% chance for an impulsive choice
-            chosen_tactic = random.choice(available_tactics)
-            print(f"<{persona_name} impulsively chooses tactic: {chosen_tactic}>")
-        else: # 50% chance for a logical, "smart" choice
-            # This is the new, safer "Forced Choice" prompt
-            tactic_prompt = f"Your chosen reply style will be '{chosen_style}'.\nGiven the last comment, which of these tactics is the most logical choice for you? {available_tactics}\nJust simply choose ONE option from the list, no need to explain why"
-            chosen_tactic = get_ai_response(current_commenter_persona, tactic_prompt, use_full_backstory=False)
-            print(f"<{persona_name} logically chooses tactic: {chosen_tactic}>")
-        
-        tactic_history[persona_name].append(chosen_tactic)
-        if len(tactic_history[persona_name]) > TACTIC_COOLDOWN:
-            tactic_history[persona_name].pop(0)
+# --- CORE FUNCTIONS ---
+def get_ai_response(persona_data, prompt, use_full_backstory=False, priority=PRIORITY_SCROLL, timeout=None, task=TASK_REPLY):
+    """Generates a response from the AI, embodying the given persona. `task` picks the model route.
+    Returns None if the call was shed, refused by the circuit breaker or a rate limit, or failed."""
+    full_prompt = build_prompt(persona_data, prompt, use_full_backstory)
+    model_router = get_router()
+    try:
+        with controller.admit(priority, timeout):
+            try:
+                text = model_router.generate(full_prompt, task)
+            except RateLimited as e:
+                # The backend is healthy, just busy: the router skips it until Retry-After passes
+                controller.record_rate_limited()
+                print(f"Model call for {persona_data['name']} skipped: {e}")
+                return None
+            except Exception as e:
+                controller.record_failure()
+                print(f"Model error for {persona_data['name']}: {e}")
+                return None
+        controller.record_success()
+        return text
+    except AdmissionRejected as e:
+        print(f"Model call for {persona_data['name']} skipped: {e.reason}")
+        return None
 
-        # STEP 3: GENERATE THE FINAL REPLY
-        thread_context = "\n".join(conversation_thread)
-        memory_recall_instruction = ""
-        use_full_backstory = False
-        if "anecdote" in chosen_tactic:
-            memory_recall_instruction = "To do this, you MUST briefly reference your personal backstory to make your point."
-            use_full_backstory = True
-            
-        reply_prompt = f"The conversation so far:\n{thread_context}\n\nYour Task: Write a reply.\n- Style: {chosen_style}\n- Tactic: {chosen_tactic}\n- {memory_recall_instruction}\n- CRUCIALLY, you MUST reflect your specific voice."
-        
-        reply = get_ai_response(current_commenter_persona, reply_prompt, use_full_backstory=use_full_backstory)
-        reply_text = f"[REPLY by {persona_name}]: {reply}"
-        print(f"{reply_text}\n")
-        conversation_thread.append(reply_text)
+def run_simulation(participants=None, num_turns=None):
+    """Runs one conversation and prints it as it happens. Participants and turns
+    default to the 'simulation.*' settings in config.py."""
+    participants = participants or config['simulation.participants']
+    num_turns = num_turns or config['simulation.num_turns']
+    # Imported here: simulation imports get_ai_response from this module
+    from simulation import run_simulation as simulate, EVENT_POST, EVENT_REPLY, EVENT_TIMING
 
+    print(f"PARTICIPANTS: {participants}\n")
+    print("--- SIMULATION START ---")
+    for event in simulate(participants, num_turns, tactic_cooldown=config['simulation.tactic_cooldown']):
+        if event['type'] == EVENT_POST:
+            print(f"[POST by {event['author']}]: {event['text']}\n")
+        elif event['type'] == EVENT_REPLY:
+            print(f"[REPLY by {event['author']}]: {event['text']}\n")
+        elif event['type'] == EVENT_TIMING:
+            print(f"{event['text']}\n" + "-" * 20)
+        else:
+            print(f"MODERATOR: {event['text']}")
     print("--- SIMULATION END ---")
     
 
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Run one conversation and print it.")
+    add_arguments(parser)
+    parser.add_argument('--show-config', action='store_true', help="Print every setting and exit.")
+    args = parser.parse_args()
+    config.apply_cli(args.config, args.preset, args.set)
+    controller.configure()
+    if args.show_config:
+        print(describe_config())
+    else:
+        run_simulation(config['simulation.participants'], config['simulation.num_turns'])
\ No newline at end of file
@@ -0,0 +1,229 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- MOCK MODEL SERVER ---
+# A local stand-in for the model API, for load tests that must not spend quota.
+# Answers are written from templates using the persona, style and tactic found
+# in the prompt, after a delay drawn from a configurable distribution. Errors
+# and rate limiting can be injected. router.HTTPBackend is the client; point
+# the app at the server with GENESIS_MOCK_URL=http://127.0.0.1:8766.
+#
+#   POST /generate   {"prompt": "...", "stream": false} -> {"text": "..."}
+#                    with "stream": true, newline-delimited {"delta": "..."} then {"done": true}
+#   GET  /stats      request, error and rate-limit counters
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8766
+LATENCY_DISTRIBUTIONS = ('fixed', 'normal', 'lognormal', 'exponential')
+
+
+class MockConfig:
+    def __init__(self, latency=0.5, jitter=0.2, distribution='lognormal', error_rate=0.0,
+                 rate_limit=0.0, burst=10, words_per_second=40.0, seed=None):
+        self.latency = latency                  # mean seconds before the first word
+        self.jitter = jitter                    # spread: std dev (normal) or sigma (lognormal)
+        self.distribution = distribution
+        self.error_rate = error_rate            # share of requests answered with a 500
+        self.rate_limit = rate_limit            # requests per second before 429s; 0 turns it off
+        self.burst = burst
+        self.words_per_second = words_per_second    # streaming pace
+        self.seed = seed
+
+    def delay(self, rng):
+        if self.distribution == 'fixed' or self.latency <= 0:
+            return max(0.0, self.latency)
+        if self.distribution == 'normal':
+            return max(0.0, rng.gauss(self.latency, self.jitter))
+        if self.distribution == 'exponential':
+            return rng.expovariate(1 / self.latency)
+        # lognormal with the configured mean
+        sigma = self.jitter
+        return rng.lognormvariate(math.log(self.latency) - sigma ** 2 / 2, sigma)
+
+
+# --- TEXT ---
+OPENERS = ["Honestly,", "Look,", "Here's the thing:", "Okay, so", "Let me be clear:", "Funny you say that —"]
+MIDDLES = ["{topic} is more complicated than people admit.", "nobody here has actually thought {topic} through.",
+           "I keep coming back to {topic}.", "the real question about {topic} is who pays for it.",
+           "{topic} says more about us than about the technology."]
+CLOSERS = ["Change my mind.", "That's my two cents.", "Prove me wrong.", "Think about it.", "Anyway, that's where I stand."]
+
+
+def _field(prompt, label):
+    match = re.search(rf"-\s*{label}:\s*(.+)", prompt)
+    return match.group(1).strip() if match else None
+
+def _options(prompt):
+    match = re.search(r"\[([^\]]*)\]", prompt)
+    if not match: return []
+    return [o.strip().strip('\'"') for o in match.group(1).split(',') if o.strip()]
+
+def _topic(prompt):
+    match = re.search(r"(?:about|topic:)\s*'([^']+)'", prompt)
+    if match: return match.group(1)
+    match = re.search(r"says:\s*'([^']{0,80})", prompt)
+    return f"\"{match.group(1)}…\"" if match else "this"
+
+
+def compose(prompt, rng):
+    """Text shaped like what the prompt asks for, voiced by the persona in it."""
+    name = _field(prompt, 'Name') or 'Someone'
+    voice = _field(prompt, 'Voice') or ''
+    if 'choose ONE option' in prompt:
+        options = _options(prompt)
+        return rng.choice(options) if options else 'neutral'
+    if 'Suggest' in prompt and 'topics' in prompt:
+        count = int((re.search(r"Suggest (\d+)", prompt) or [0, 3])[1])
+        return '\n'.join(f"What would {name} do if {rng.choice(['AI', 'automation', 'the internet', 'money'])} "
+                         f"{rng.choice(['disappeared', 'ran everything', 'became free', 'was banned'])} tomorrow? ({i + 1})"
+                         for i in range(count))
+    if re.search(r"\btitle for\b", prompt):     # "Generate a short, catchy title for a post about ..."
+        return f"{rng.choice(['Unpopular opinion', 'Hot take', 'Serious question', 'Reality check'])}: {_topic(prompt)}"
+    style = _field(prompt, 'Style') or (re.search(r"style '([^']+)'", prompt) or [None, None])[1]
+    tactic = _field(prompt, 'Tactic') or (re.search(r"tactic '([^']+)'", prompt) or [None, None])[1]
+    sentences = [rng.choice(OPENERS), rng.choice(MIDDLES).format(topic=_topic(prompt))]
+    if tactic:
+        sentences.append(f"(I'm going to {tactic.replace('_', ' ')} here.)")
+    if style:
+        sentences.append(f"Call it {style.replace('_', ' ')}.")
+    if voice:
+        sentences.append(f"That's just how {name} talks: {voice.split('.')[0].lower()}.")
+    sentences.append(rng.choice(CLOSERS))
+    return ' '.join(sentences)
+
+
+# --- SERVER ---
+class MockModel:
+    def __init__(self, config):
+        self.config = config
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'streamed': 0}
+        self._lock = threading.Lock()
+        self._tokens = float(config.burst)
+        self._updated = time.monotonic()
+
+    def admit(self):
+        """Token bucket for rate limiting. Returns seconds to wait, or 0 if admitted."""
+        if self.config.rate_limit <= 0: return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.config.burst, self._tokens + (now - self._updated) * self.config.rate_limit)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.config.rate_limit
+
+    def rng_for(self, prompt):
+        seed = hashlib.sha256(f"{self.config.seed}:{prompt}".encode()).digest() if self.config.seed is not None else None
+        return random.Random(seed)
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, payload, status=200, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                return self._send_json(mock.stats)
+            self._send_json({'error': 'not found'}, 404)
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/generate':
+                return self._send_json({'error': 'not found'}, 404)
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                prompt = str(request['prompt'])
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send_json({'error': f"bad request: {e}"}, 400)
+            mock.count('requests')
+            retry_after = mock.admit()
+            if retry_after:
+                mock.count('rate_limited')
+                return self._send_json({'error': 'rate limited'}, 429, {'Retry-After': f"{retry_after:.2f}"})
+
+            rng = mock.rng_for(prompt)
+            time.sleep(mock.config.delay(rng))
+            if rng.random() < mock.config.error_rate:
+                mock.count('errors')
+                return self._send_json({'error': 'injected failure'}, 500)
+            text = compose(prompt, rng)
+            if request.get('stream'):
+                mock.count('streamed')
+                return self._stream(text)
+            self._send_json({'text': text})
+
+        def _stream(self, text):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            pause = 1 / mock.config.words_per_second if mock.config.words_per_second > 0 else 0
+            try:
+                for i, word in enumerate(text.split(' ')):
+                    self._chunk({'delta': word if i == 0 else ' ' + word})
+                    if pause: time.sleep(pause)
+                self._chunk({'done': True})
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _chunk(self, payload):
+            line = json.dumps(payload).encode() + b'\n'
+            self.wfile.write(f"{len(line):X}\r\n".encode() + line + b'\r\n')
+            self.wfile.flush()
+
+    return Handler
+
+
+def serve(config, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), make_handler(MockModel(config)))
+    server.daemon_threads = True
+    print(f"Mock model listening on http://{host}:{port} ({config.distribution} latency, mean {config.latency}s). Press Ctrl-C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nMock model shutting down. Goodbye!")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock model for offline load tests.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency', type=float, default=0.5, help="Mean seconds per response (default: 0.5).")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Std dev (normal) or sigma (lognormal) of the latency.")
+    parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests that fail with a 500.")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Requests per second before 429s (0 = unlimited).")
+    parser.add_argument('--burst', type=int, default=10, help="Requests allowed at once before rate limiting.")
+    parser.add_argument('--words-per-second', type=float, default=40.0, help="Pace of streamed responses.")
+    parser.add_argument('--seed', type=int, default=None, help="Same prompt, same answer and delay.")
+    args = parser.parse_args()
+    serve(MockConfig(args.latency, args.jitter, args.distribution, args.error_rate,
+                     args.rate_limit, args.burst, args.words_per_second, args.seed), args.host, args.port)
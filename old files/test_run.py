@@ -1,4 +1,5 @@
-from app import run_simulation
+from simulation import run_simulation
 
-for entry in run_simulation(['jax','kaelen'], 1):
-    print(entry)
+if __name__ == '__main__':
+    for entry in run_simulation(['jax','kaelen'], 1):
+        print(entry)
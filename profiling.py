@@ -0,0 +1,238 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# --- PROFILING MODE ---
+# Three views of the same run, written together when profiling stops:
+#   <base>.collapsed      sampled stacks, one "frame;frame;frame count" line each,
+#                         ready for flamegraph.pl or speedscope
+#   <base>.functions.txt  cProfile cumulative timings (the .prof next to it opens in snakeviz)
+#   <base>.alloc.txt      tracemalloc: where memory grew while profiling
+# where <base> is <out dir>/<name>-<time>-<pid>-<n>, n counting reports in this process.
+# A running engine is toggled (at its next poll) with `kill -USR1 <pid>` or by creating/removing the
+# control file. Streamlit reruns are profiled one rerun at a time while the
+# control file exists (or GENESIS_PROFILE=1).
+
+PROFILE_DIR = os.environ.get('GENESIS_PROFILE_DIR', 'profiles')
+CONTROL_FILE = os.environ.get('GENESIS_PROFILE_FILE', 'profile.on')
+SAMPLE_INTERVAL = 0.005     # seconds between stack samples
+MAX_DEPTH = 128             # frames kept per sampled stack
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+
+# tracemalloc is process-wide: it is started for the first running Profiler
+# (unless something else already traces) and stopped after the last one.
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_ours = False
+
+_file_numbers = itertools.count(1)      # keeps concurrent profilers from sharing a file name
+
+def _start_tracing():
+    global _tracing_users, _tracing_ours
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_ours = True
+        _tracing_users += 1
+
+def _stop_tracing():
+    global _tracing_users, _tracing_ours
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_ours:
+            tracemalloc.stop()
+            _tracing_ours = False
+
+
+def frame_label(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Samples the Python stacks of running threads from a background thread.
+    Counts are wall-clock: a thread blocked in SQLite or a model call shows up too."""
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids        # None samples every thread
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+
+class Profiler:
+    def __init__(self, name, out_dir=PROFILE_DIR, interval=SAMPLE_INTERVAL, thread_ids=None):
+        self.name = name
+        self.out_dir = out_dir
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.sampler = None
+        self.profile = None
+        self.started = None
+        self._baseline = None
+        self._control_seen = False
+        self._toggle_requested = False      # set by the signal, acted on by poll()
+        self.runs = 0
+        self._lock = threading.RLock()
+
+    @property
+    def running(self):
+        return self.sampler is not None
+
+    def start(self):
+        with self._lock:
+            if self.running: return
+            _start_tracing()
+            self._baseline = tracemalloc.take_snapshot()
+            self.sampler = StackSampler(self.interval, self.thread_ids)
+            self.sampler.start()
+            self.profile = cProfile.Profile()
+            self.profile.enable()       # only sees the thread that called start()
+            self.started = time.perf_counter()
+            print(f"[PROFILE] {self.name}: profiling started.")
+
+    def stop(self):
+        """Stops profiling and writes the reports. Returns the paths written."""
+        with self._lock:
+            if not self.running: return []
+            self.profile.disable()
+            self.sampler.stop()
+            elapsed = time.perf_counter() - self.started
+            try:
+                paths = self._write(elapsed)
+            except (OSError, RuntimeError) as e:
+                print(f"[PROFILE] Could not write profile: {e}")
+                paths = []
+            _stop_tracing()
+            self.sampler = self.profile = self._baseline = None
+            if paths:
+                print(f"[PROFILE] {self.name}: {elapsed:.1f}s profiled, wrote {', '.join(paths)}")
+            return paths
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def _write(self, elapsed):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.runs += 1
+        base = os.path.join(self.out_dir, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_file_numbers)}")
+
+        with open(base + '.collapsed', 'w') as f:
+            f.write(self.sampler.collapsed())
+
+        self.profile.dump_stats(base + '.prof')
+        report = io.StringIO()
+        report.write(f"# {self.name}: {elapsed:.2f}s wall clock, {self.sampler.samples} stack samples\n")
+        pstats.Stats(self.profile, stream=report).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        with open(base + '.functions.txt', 'w') as f:
+            f.write(report.getvalue())
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        current, peak = tracemalloc.get_traced_memory()
+        with open(base + '.alloc.txt', 'w') as f:
+            f.write(f"# traced memory: current {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB\n")
+            f.write("# growth since profiling started, by line:\n")
+            for stat in snapshot.compare_to(self._baseline, 'lineno')[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        return [base + ext for ext in ('.collapsed', '.functions.txt', '.prof', '.alloc.txt')]
+
+    # --- TOGGLES ---
+    def install_signal(self, signum=None):
+        """Toggles profiling on SIGUSR1 (where the platform has it), at the next poll().
+        Call from the main thread."""
+        signum = signum if signum is not None else getattr(signal, 'SIGUSR1', None)
+        if signum is None: return False
+        signal.signal(signum, self._on_signal)
+        return True
+
+    def _on_signal(self, *_):
+        # Only a flag: the handler may interrupt start() or stop() halfway through
+        self._toggle_requested = True
+
+    def poll(self, control_file=CONTROL_FILE):
+        """Toggles profiling if a signal asked for it, then starts profiling when the control
+        file appears and stops it when the file is removed. Only changes to the file count,
+        so a run started by a signal is left alone."""
+        if self._toggle_requested:
+            self._toggle_requested = False
+            self.toggle()
+        exists = os.path.exists(control_file)
+        if exists == self._control_seen: return
+        self._control_seen = exists
+        if exists != self.running:
+            self.toggle()
+
+
+_reruns = {}                # (script, session) -> Profiler of that session's current rerun
+_reruns_lock = threading.Lock()
+
+def _session_id():
+    """The Streamlit session running this thread, or the thread itself outside Streamlit."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        ctx = None
+    return ctx.session_id if ctx is not None else threading.get_ident()
+
+def profile_rerun(name):
+    """A started Profiler for one Streamlit rerun when profiling is switched on, else None.
+    Call .stop() on it at the end of the script. Each session is profiled separately."""
+    key = (name, _session_id())
+    with _reruns_lock:
+        previous = _reruns.pop(key, None)
+    if previous is not None:
+        previous.stop()         # this session's last rerun ended early (st.rerun or st.stop)
+    if os.environ.get('GENESIS_PROFILE') != '1' and not os.path.exists(CONTROL_FILE):
+        return None
+    profiler = Profiler(name, thread_ids={threading.get_ident()})
+    with _reruns_lock:
+        for done in [k for k, p in _reruns.items() if not p.running]:
+            del _reruns[done]       # reruns that reached their own stop()
+        _reruns[key] = profiler
+    profiler.start()
+    return profiler
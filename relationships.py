@@ -0,0 +1,80 @@
+import random
+
+# --- RELATIONSHIP ENGINE ---
+# Every persona keeps a score for every other persona. Scores start from the
+# persona JSON 'relationship_scores', move after each reply, and are stored as a
+# dense persona x persona list so a lookup is one index calculation.
+
+REPLY_DELTA = 1.0          # how much a persona warms to someone they chose to answer
+REPLIED_TO_DELTA = 0.5     # how much the person being answered warms back
+HOSTILE_DELTA = -1.0       # replacing REPLY_DELTA when the tactic is hostile
+HOSTILE_TACTIC_WORDS = ('disagree', 'dismiss', 'mock', 'attack', 'flaw')
+SCORE_LIMIT = 10.0
+AFFINITY_BIAS = 0.15       # weight = 1 + score * AFFINITY_BIAS when picking who to engage with
+MIN_WEIGHT = 0.1
+
+
+class RelationshipMatrix:
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.size = len(self.names)
+        self.scores = [0.0] * (self.size * self.size)
+        self._dirty = set()
+
+    @classmethod
+    def from_personas(cls, personas, storage=None):
+        """Seeds from the persona JSON files, then applies any scores saved in storage."""
+        names = [p['name'] for p in personas]
+        for p in personas:
+            names.extend(p.get('relationship_scores', {}))
+        matrix = cls(names)
+        for p in personas:
+            for other, score in p.get('relationship_scores', {}).items():
+                matrix.set(p['name'], other, score, mark_dirty=False)
+        if storage is not None:
+            for row in storage.load_relationship_scores():
+                matrix.set(row['source'], row['target'], row['score'], mark_dirty=False)
+        return matrix
+
+    def score(self, source, target):
+        """How `source` feels about `target` (0 for anyone unknown)."""
+        i, j = self.index.get(source), self.index.get(target)
+        if i is None or j is None: return 0.0
+        return self.scores[i * self.size + j]
+
+    def set(self, source, target, value, mark_dirty=True):
+        i, j = self.index.get(source), self.index.get(target)
+        if i is None or j is None or i == j: return
+        cell = i * self.size + j
+        self.scores[cell] = max(-SCORE_LIMIT, min(SCORE_LIMIT, float(value)))
+        if mark_dirty: self._dirty.add(cell)
+
+    def adjust(self, source, target, delta):
+        self.set(source, target, self.score(source, target) + delta)
+
+    def record_reply(self, replier, target, tactic=''):
+        """Updates both directions after `replier` answers `target`."""
+        if replier == target: return
+        hostile = any(word in str(tactic).lower() for word in HOSTILE_TACTIC_WORDS)
+        self.adjust(replier, target, HOSTILE_DELTA if hostile else REPLY_DELTA)
+        self.adjust(target, replier, HOSTILE_DELTA / 2 if hostile else REPLIED_TO_DELTA)
+
+    def affinity_weight(self, source, target):
+        return max(MIN_WEIGHT, 1 + self.score(source, target) * AFFINITY_BIAS)
+
+    def choose(self, source, candidates, author_of):
+        """Picks one candidate, biased toward authors `source` likes."""
+        if not candidates: return None
+        weights = [self.affinity_weight(source, author_of(c)) for c in candidates]
+        return random.choices(candidates, weights=weights, k=1)[0]
+
+    def flush(self, storage):
+        """Writes the cells that changed since the last flush."""
+        if not self._dirty: return
+        rows = []
+        for cell in self._dirty:
+            i, j = divmod(cell, self.size)
+            rows.append((self.names[i], self.names[j], self.scores[cell]))
+        storage.save_relationship_scores(rows)
+        self._dirty.clear()
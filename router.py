@@ -0,0 +1,349 @@
+import hashlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# --- MODEL ROUTER ---
+# Every model call names a task. The router keeps a list of backends per task,
+# tries the healthiest and fastest first, and if that one is slow it sends the
+# same prompt to a second backend and takes whichever answers first. A call
+# the router stops waiting for counts as a failure straight away, so a backend
+# that hangs drops down the ranking instead of holding every call up.
+
+TASK_CHOICE = 'choice'      # picking a style or tactic from a list
+TASK_TITLE = 'title'        # post titles and other one-liners
+TASK_POST = 'post'          # opening posts
+TASK_REPLY = 'reply'        # comments and replies
+ALL_TASKS = (TASK_CHOICE, TASK_TITLE, TASK_POST, TASK_REPLY)
+
+STATS_WINDOW = 50           # recent calls kept per backend for latency and error rate
+UNHEALTHY_ERROR_RATE = 0.5  # backends above this are tried last
+HEDGE_FACTOR = 1.5          # hedge once the primary runs this much past its own p90
+HEDGE_DEFAULT = 5.0         # seconds to wait before hedging a backend with no history
+HEDGE_MIN = 0.2
+RATE_LIMIT_BACKOFF = 5.0    # seconds a backend is skipped after a 429 that gave no Retry-After
+CALL_TIMEOUT = 60.0         # seconds a routed call may take in total, hedges included
+BACKEND_MAX_IN_FLIGHT = 8   # calls one backend may have running, abandoned ones included
+
+
+class BackendMiss(Exception):
+    """A backend that has nothing for this prompt (e.g. a replay cache miss)."""
+
+
+class RateLimited(Exception):
+    """The model server asked us to slow down (HTTP 429)."""
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# --- BACKENDS ---
+class Backend:
+    name = 'backend'
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+
+class GenAIBackend(Backend):
+    """A google.generativeai GenerativeModel."""
+    def __init__(self, model, name=None):
+        self.model = model
+        self.name = name or getattr(model, 'model_name', 'genai')
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text.strip()
+
+
+class LocalBackend(Backend):
+    """A stand-in model that answers with canned text after a simulated delay."""
+    def __init__(self, name='dummy', text="This is a simplified, direct simulated reply.",
+                 latency=0.0, jitter=0.0, error_rate=0.0):
+        self.name = name
+        self.text = text
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def generate(self, prompt):
+        delay = max(0.0, random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+        if delay: time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name}: simulated failure")
+        return self.text
+
+
+class HTTPBackend(Backend):
+    """A model behind a small JSON API, such as the mock server in mockllm.py.
+    POSTs {"prompt", "stream"} to `url`; streamed answers are read as
+    newline-delimited {"delta": ...} chunks and joined."""
+    def __init__(self, url, name='http', timeout=30.0, stream=False):
+        url = url.rstrip('/')
+        self.url = url if url.endswith('/generate') else url + '/generate'
+        self.name = name
+        self.timeout = timeout
+        self.stream = stream
+
+    def generate(self, prompt):
+        body = json.dumps({'prompt': prompt, 'stream': self.stream}).encode()
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                if not self.stream:
+                    return json.loads(response.read())['text'].strip()
+                parts = []
+                for line in response:
+                    if not line.strip(): continue
+                    chunk = json.loads(line)
+                    if chunk.get('done'): break
+                    parts.append(chunk.get('delta', ''))
+                return ''.join(parts).strip()
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                retry_after = e.headers.get('Retry-After')
+                raise RateLimited(f"{self.name}: rate limited", float(retry_after) if retry_after else None)
+            raise RuntimeError(f"{self.name}: HTTP {e.code}")
+
+
+class ReplayBackend(Backend):
+    """Answers prompts seen before from a JSONL file of {"key", "text"} lines.
+    With record=True, answers from the other backends are appended to the file."""
+    name = 'replay'
+
+    def __init__(self, path, record=False):
+        self.path = path
+        self.record = record
+        self.cache = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.cache[entry['key']] = entry['text']
+
+    @staticmethod
+    def key(prompt):
+        return hashlib.sha256(prompt.encode()).hexdigest()
+
+    def generate(self, prompt):
+        text = self.cache.get(self.key(prompt))
+        if text is None: raise BackendMiss('not in replay cache')
+        return text
+
+    def store(self, prompt, text):
+        if not self.record: return
+        key = self.key(prompt)
+        with self._lock:
+            if key in self.cache: return
+            self.cache[key] = text
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'key': key, 'text': text}) + '\n')
+
+
+# --- HEALTH TRACKING ---
+class BackendStats:
+    def __init__(self):
+        self.latencies = deque(maxlen=STATS_WINDOW)
+        self.outcomes = deque(maxlen=STATS_WINDOW)     # True for success
+        self.running = {}           # call id -> [started, abandoned]
+        self.abandoned = 0
+        self.rate_limited = 0
+        self.paused_until = 0.0     # monotonic time until which the backend asked not to be called
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            if ok: self.latencies.append(latency)
+            self.outcomes.append(ok)
+
+    def begin(self):
+        """Notes a call starting; returns its id for end() or abandon()."""
+        with self._lock:
+            call_id = next(self._ids)
+            self.running[call_id] = [time.monotonic(), False]
+            return call_id
+
+    def end(self, call_id, ok):
+        """Records a finished call; `ok` None leaves the health figures alone."""
+        with self._lock:
+            started, abandoned = self.running.pop(call_id)
+            if abandoned or ok is None: return      # abandoned calls were counted when given up on
+            if ok: self.latencies.append(time.monotonic() - started)
+            self.outcomes.append(ok)
+
+    def abandon(self, call_id):
+        """Counts a call the router stopped waiting for as a failure that took at least
+        as long as it has so far. It keeps its place in `running` until it returns."""
+        with self._lock:
+            call = self.running.get(call_id)
+            if call is None or call[1]: return
+            call[1] = True
+            self.abandoned += 1
+            self.latencies.append(time.monotonic() - call[0])
+            self.outcomes.append(False)
+
+    def pause(self, seconds):
+        """Skips the backend for `seconds`, as a 429's Retry-After asks."""
+        with self._lock:
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def paused(self):
+        """Seconds left before the backend may be called again, or 0."""
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def busy(self):
+        with self._lock:
+            return len(self.running)
+
+    def stalled_for(self):
+        """Seconds the oldest call still being waited on has been running, or 0."""
+        with self._lock:
+            waiting = [started for started, abandoned in self.running.values() if not abandoned]
+        return time.monotonic() - min(waiting) if waiting else 0.0
+
+    def percentile(self, q):
+        with self._lock:
+            if not self.latencies: return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self):
+        with self._lock:
+            if not self.outcomes: return 0.0
+            return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def snapshot(self):
+        return {'p50': self.percentile(0.5), 'p90': self.percentile(0.9),
+                'error_rate': round(self.error_rate(), 3), 'calls': len(self.outcomes),
+                'running': self.busy(), 'abandoned': self.abandoned, 'rate_limited': self.rate_limited}
+
+
+# --- ROUTER ---
+class ModelRouter:
+    def __init__(self, max_in_flight=BACKEND_MAX_IN_FLIGHT, call_timeout=CALL_TIMEOUT):
+        self.backends = {}
+        self.routes = {task: [] for task in ALL_TASKS}
+        self.stats = {}
+        self.replay = None
+        self.hedged = 0
+        self.timeouts = 0
+        self.max_in_flight = max_in_flight
+        self.call_timeout = call_timeout
+        # One pool per backend, so calls stuck on one backend can't starve the others
+        self._pools = {}
+
+    def register(self, backend, tasks=ALL_TASKS):
+        self.backends[backend.name] = backend
+        self.stats.setdefault(backend.name, BackendStats())
+        if backend.name not in self._pools:
+            self._pools[backend.name] = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                                           thread_name_prefix=f"model-{backend.name}")
+        for task in tasks:
+            if backend.name not in self.routes[task]:
+                self.routes[task].append(backend.name)
+        if isinstance(backend, ReplayBackend):
+            self.replay = backend
+
+    def ranked(self, task):
+        """Backends for `task`: replay first, rate-limited ones last, then healthy before unhealthy
+        (mostly failing, or with a call running past its hedge delay right now), then by median
+        latency. A backend with no latency history yet goes ahead of the measured ones so that it
+        gets measured."""
+        def rank(name):
+            stats = self.stats[name]
+            p50 = stats.percentile(0.5)
+            return (name != getattr(self.replay, 'name', None),
+                    stats.paused() > 0,
+                    stats.error_rate() > UNHEALTHY_ERROR_RATE or stats.stalled_for() > self.hedge_delay(name),
+                    p50 if p50 is not None else 0.0)
+        return sorted(self.routes.get(task) or self.routes[TASK_REPLY], key=rank)
+
+    def _call(self, name, prompt, call_id):
+        ok = False
+        try:
+            text = self.backends[name].generate(prompt)
+            ok = True
+            return text
+        except BackendMiss:
+            ok = None           # a miss says nothing about the backend's health
+            raise
+        except RateLimited as e:
+            ok = None           # nor does being asked to slow down: the backend is skipped for a while instead
+            self.stats[name].pause(e.retry_after if e.retry_after is not None else RATE_LIMIT_BACKOFF)
+            raise
+        finally:
+            self.stats[name].end(call_id, ok)
+
+    def _submit(self, name, prompt, futures):
+        """Starts a call on `name` unless it is rate limited or already has max_in_flight calls running."""
+        stats = self.stats[name]
+        if stats.paused() or stats.busy() >= self.max_in_flight: return False
+        call_id = stats.begin()
+        futures[self._pools[name].submit(self._call, name, prompt, call_id)] = (name, call_id)
+        return True
+
+    def hedge_delay(self, name):
+        p90 = self.stats[name].percentile(0.9)
+        return HEDGE_DEFAULT if p90 is None else max(HEDGE_MIN, p90 * HEDGE_FACTOR)
+
+    def generate(self, prompt, task=TASK_REPLY, timeout=None):
+        """Text for `prompt` from the best backend for `task`. Raises the last error if all fail,
+        or TimeoutError once `timeout` (default call_timeout) seconds have passed."""
+        candidates = self.ranked(task)
+        if not candidates:
+            raise RuntimeError(f"No model backend registered for task '{task}'")
+        limit = self.call_timeout if timeout is None else timeout
+        deadline = time.monotonic() + limit
+        last_error = None
+        futures = {}
+        try:
+            while candidates:
+                primary = candidates.pop(0)
+                if not self._submit(primary, prompt, futures):
+                    paused = self.stats[primary].paused()
+                    if paused:
+                        last_error = RateLimited(f"{primary}: rate limited for another {paused:.1f}s", paused)
+                    else:
+                        last_error = RuntimeError(f"{primary}: too many calls in flight")
+                    continue
+                done, _ = wait(futures, timeout=min(self.hedge_delay(primary), max(0.0, deadline - time.monotonic())))
+                # Primary is running slow: race it against the next backend that has room
+                while not done and candidates:
+                    if self._submit(candidates.pop(0), prompt, futures):
+                        self.hedged += 1
+                        break
+                pending = set(futures)
+                while pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise TimeoutError(f"no backend answered within {limit:g}s")
+                    done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name, _ = futures.pop(future)
+                        try:
+                            text = future.result()
+                        except Exception as e:
+                            last_error = e
+                            continue
+                        if self.replay is not None and name != self.replay.name:
+                            self.replay.store(prompt, text)
+                        return text
+        finally:
+            # Calls still running lost the race or ran out of time: count them against their backend now
+            for name, call_id in futures.values():
+                self.stats[name].abandon(call_id)
+        raise last_error
+
+    def metrics(self):
+        return {'hedged': self.hedged, 'timeouts': self.timeouts, **{name: stats.snapshot() for name, stats in self.stats.items()}}
@@ -0,0 +1,106 @@
+import re
+
+from clock import to_micros
+
+# --- FULL-TEXT SEARCH ---
+# FTS5 indexes over posts and comments. The index tables use the real tables as
+# external content and triggers keep them in sync, so every writer (engine,
+# scripts, old tools) is covered without going through a particular code path.
+
+SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, content, content='posts', content_rowid='id')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(content, content='comments', content_rowid='id')",
+    '''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, content ON posts BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO posts_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts (comments_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF content ON comments BEGIN
+        INSERT INTO comments_fts (comments_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO comments_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    ''',
+]
+
+HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE = '**', '**'
+SNIPPET_TOKENS = 16
+
+
+def ensure_search_index(conn):
+    """Creates the FTS tables and triggers; backfills them the first time."""
+    existing = conn.execute("SELECT name FROM sqlite_master WHERE name IN ('posts_fts', 'comments_fts')").fetchall()
+    for statement in SEARCH_SCHEMA:
+        conn.execute(statement)
+    if len(existing) < 2:
+        conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO comments_fts (comments_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def to_match_query(text):
+    """Turns free text into an FTS5 query: every word must appear, 'word*' is a prefix search."""
+    terms = []
+    for word in re.findall(r'[\w\'-]+\*?', text):
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def _filters(alias, author, subreddit, since, until):
+    clauses, params = [], []
+    if author:
+        clauses.append(f"{alias}.author_name = ?"); params.append(author)
+    if subreddit:
+        clauses.append("p.subreddit = ?"); params.append(subreddit)
+    if since is not None:
+        clauses.append(f"{alias}.created_us >= ?"); params.append(to_micros(since))
+    if until is not None:
+        clauses.append(f"{alias}.created_us <= ?"); params.append(to_micros(until))
+    return ''.join(f" AND {c}" for c in clauses), params
+
+
+def search_content(conn, text, author=None, subreddit=None, since=None, until=None, limit=20):
+    """Ranked posts and comments matching `text`, best first, with highlighted snippets."""
+    match = to_match_query(text)
+    if not match: return []
+    post_filters, post_params = _filters('p', author, subreddit, since, until)
+    comment_filters, comment_params = _filters('c', author, subreddit, since, until)
+    query = f"""
+        SELECT 'post' AS kind, p.id, p.id AS post_id, p.subreddit, p.author_name, p.title, p.timestamp,
+               snippet(posts_fts, -1, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet, bm25(posts_fts) AS rank
+        FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+        WHERE posts_fts MATCH ?{post_filters}
+        UNION ALL
+        SELECT 'comment' AS kind, c.id, c.post_id, p.subreddit, c.author_name, p.title, c.timestamp,
+               snippet(comments_fts, 0, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet, bm25(comments_fts) AS rank
+        FROM comments_fts JOIN comments c ON c.id = comments_fts.rowid JOIN posts p ON p.id = c.post_id
+        WHERE comments_fts MATCH ?{comment_filters}
+        ORDER BY rank LIMIT ?
+    """
+    params = ([HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE, match] + post_params +
+              [HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE, match] + comment_params + [limit])
+    return conn.execute(query, params).fetchall()
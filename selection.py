@@ -0,0 +1,180 @@
+import random
+
+# --- STYLE AND TACTIC SELECTION ---
+# Each persona draws reply styles and tactics from its persona JSON lists
+# ('reply_style_preference', 'possible_tactics'; a {option: weight} dict gives
+# weights, and a list counts repeats). Options are sampled from a precomputed
+# alias table, so a draw is two random numbers whatever the list length. Cooldown
+# is a fixed-size ring of the persona's last choices plus a count per option:
+# a draw that lands on an option still cooling down is retried, and recording a
+# choice overwrites one slot. Nothing is allocated per turn. Ring slots are
+# saved to storage so cooldowns survive an engine restart.
+
+STYLE = 'style'
+TACTIC = 'tactic'
+PERSONA_FIELDS = {STYLE: 'reply_style_preference', TACTIC: 'possible_tactics'}
+DEFAULT_OPTIONS = {STYLE: ['neutral'], TACTIC: ['share_an_opinion']}
+MAX_RETRIES = 8             # rejected draws before falling back to a scan of the allowed options
+
+
+class AliasTable:
+    """Vose's alias method: O(n) to build, O(1) per weighted draw."""
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        self.n = n
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng=random):
+        i = int(rng.random() * self.n)
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class CooldownRing:
+    """The last `size` choices, with O(1) "is this cooling down?" checks."""
+    def __init__(self, size):
+        self.size = max(0, size)
+        self.slots = [None] * self.size
+        self.counts = {}
+        self.position = 0           # the slot the next choice overwrites
+
+    def blocked(self, option):
+        return self.counts.get(option, 0) > 0
+
+    def push(self, option):
+        """Records `option`; returns the slot it was written to, or None when cooldown is off."""
+        if not self.size: return None
+        slot = self.position
+        old = self.slots[slot]
+        if old is not None:
+            self.counts[old] -= 1
+        self.slots[slot] = option
+        self.counts[option] = self.counts.get(option, 0) + 1
+        self.position = (slot + 1) % self.size
+        return slot
+
+    def restore(self, rows):
+        """Puts saved (slot, turn, option) rows back where they were written. If the
+        ring has shrunk since, the newest rows are replayed into fresh slots instead."""
+        rows = sorted(rows, key=lambda row: row[1])
+        if not self.size or not rows: return
+        if any(slot >= self.size for slot, _, _ in rows):
+            for _, _, option in rows[-self.size:]:
+                self.push(option)
+            return
+        for slot, _, option in rows:
+            self.slots[slot] = option
+            self.counts[option] = self.counts.get(option, 0) + 1
+        self.position = (rows[-1][0] + 1) % self.size
+
+    def recent(self):
+        """Choices in the ring, oldest first."""
+        ordered = self.slots[self.position:] + self.slots[:self.position]
+        return [option for option in ordered if option is not None]
+
+
+class OptionSet:
+    def __init__(self, options):
+        if isinstance(options, dict):
+            weights = {o: float(w) for o, w in options.items() if w > 0}
+        else:
+            weights = {}
+            for option in options:
+                weights[option] = weights.get(option, 0) + 1.0
+        self.options = list(weights)
+        self.weights = [weights[o] for o in self.options]
+        self.table = AliasTable(self.weights) if self.options else None
+
+
+class SelectionEngine:
+    def __init__(self, style_cooldown=1, tactic_cooldown=2):
+        self.cooldowns = {STYLE: style_cooldown, TACTIC: tactic_cooldown}
+        self.options = {}           # (persona, kind) -> OptionSet
+        self.rings = {}             # (persona, kind) -> CooldownRing
+        self.turns = 0              # orders saved history across restarts
+        self._dirty = {}            # (persona, kind, slot) -> (turn, option)
+
+    @classmethod
+    def from_personas(cls, personas, storage=None, style_cooldown=1, tactic_cooldown=2):
+        """Builds the option tables from the persona JSON, then replays any history saved in storage."""
+        engine = cls(style_cooldown, tactic_cooldown)
+        for p in personas:
+            for kind, field in PERSONA_FIELDS.items():
+                engine.options[(p['name'], kind)] = OptionSet(p.get(field) or DEFAULT_OPTIONS[kind])
+                engine.rings[(p['name'], kind)] = CooldownRing(engine.cooldowns[kind])
+        if storage is not None:
+            saved = {}
+            for row in storage.load_selection_history():
+                saved.setdefault((row['persona'], row['kind']), []).append((row['slot'], row['turn'], row['choice']))
+                engine.turns = max(engine.turns, row['turn'])
+            for key, rows in saved.items():
+                if key in engine.rings: engine.rings[key].restore(rows)
+        return engine
+
+    def available(self, persona, kind):
+        """Options not cooling down (all of them if every option is), for prompts."""
+        options = self.options[(persona, kind)].options
+        ring = self.rings[(persona, kind)]
+        allowed = [o for o in options if not ring.blocked(o)]
+        return allowed or list(options)
+
+    def choose(self, persona, kind, rng=random):
+        """A weighted draw that skips options still cooling down, recorded as the persona's choice."""
+        option_set = self.options[(persona, kind)]
+        ring = self.rings[(persona, kind)]
+        options = option_set.options
+        choice = None
+        for _ in range(MAX_RETRIES):
+            candidate = options[option_set.table.sample(rng)]
+            if not ring.blocked(candidate):
+                choice = candidate
+                break
+        if choice is None:
+            # Most of the weight is cooling down: draw from what is left
+            allowed = [i for i, o in enumerate(options) if not ring.blocked(o)]
+            if allowed:
+                choice = options[rng.choices(allowed, weights=[option_set.weights[i] for i in allowed])[0]]
+            else:
+                choice = options[option_set.table.sample(rng)]
+        self.record(persona, kind, choice)
+        return choice
+
+    def record(self, persona, kind, choice):
+        """Puts a choice made elsewhere (e.g. by the model) on cooldown."""
+        ring = self.rings.get((persona, kind))
+        if ring is None: return
+        self.turns += 1
+        slot = ring.push(choice)
+        if slot is not None:
+            self._dirty[(persona, kind, slot)] = (self.turns, choice)
+
+    def set_cooldowns(self, style_cooldown, tactic_cooldown):
+        """Resizes the rings, keeping the most recent choices that still fit."""
+        for kind, size in ((STYLE, style_cooldown), (TACTIC, tactic_cooldown)):
+            if self.cooldowns[kind] == size: continue
+            self.cooldowns[kind] = size
+            for (persona, ring_kind), ring in list(self.rings.items()):
+                if ring_kind != kind: continue
+                # Re-recorded so storage matches the new slot layout
+                self.rings[(persona, kind)] = CooldownRing(size)
+                for option in ring.recent()[-size:] if size else []:
+                    self.record(persona, kind, option)
+
+    def flush(self, storage):
+        """Writes the ring slots that changed since the last flush."""
+        if not self._dirty: return
+        storage.save_selection_history([(persona, kind, slot, turn, choice)
+                                        for (persona, kind, slot), (turn, choice) in self._dirty.items()])
+        self._dirty.clear()
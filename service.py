@@ -0,0 +1,268 @@
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from admission import controller
+from mainr import get_router
+from simulation import run_simulation
+
+# --- SIMULATION SERVICE ---
+# A local HTTP process that owns running simulations. Runs execute on a worker
+# pool, every entry is kept on the run, and any number of viewers can follow a
+# run by polling or by holding a streaming connection open.
+#
+#   POST /runs                   {"participants": [...], "num_turns": 3} -> {"id": ...}
+#   GET  /runs                   runs in progress and the last KEEP_FINISHED finished ones, newest first
+#   GET  /runs/<id>?since=N&wait=S   entries from index N, waiting up to S seconds for new ones
+#   GET  /runs/<id>/stream       newline-delimited JSON entries until the run ends
+#   POST /runs/<id>/cancel       stop the run after its current model call
+#   GET  /metrics                model-call admission and routing metrics for this process
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_SERVICE_URL = os.environ.get('GENESIS_SERVICE_URL', f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+MAX_WAIT = 30
+KEEP_FINISHED = 200         # finished runs kept for viewers; older ones are dropped as new runs start
+FINISHED = ('done', 'error', 'cancelled')
+
+
+class SimulationRun:
+    def __init__(self, run_id, participants, num_turns):
+        self.id = run_id
+        self.participants = participants
+        self.num_turns = num_turns
+        self.status = 'queued'
+        self.error = None
+        self.entries = []
+        self.created = time.time()
+        self.finished = None
+        self.cancel = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    def append(self, entry):
+        with self._changed:
+            self.entries.append(entry)
+            self._changed.notify_all()
+
+    def set_status(self, status, error=None):
+        with self._changed:
+            self.status = status
+            self.error = error
+            if self.done: self.finished = time.time()
+            self._changed.notify_all()
+
+    def wait_for(self, since, timeout):
+        """Blocks until there are entries past `since`, the run ends, or `timeout` passes."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while len(self.entries) <= since and not self.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                self._changed.wait(remaining)
+            return self.entries[since:], self.status
+
+    def summary(self):
+        return {'id': self.id, 'participants': self.participants, 'num_turns': self.num_turns,
+                'status': self.status, 'error': self.error, 'entries': len(self.entries),
+                'created': self.created, 'finished': self.finished}
+
+
+class SimulationService:
+    def __init__(self, max_workers=4, keep_finished=KEEP_FINISHED):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='simulation')
+        self.keep_finished = keep_finished
+        self.runs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, participants, num_turns):
+        with self._lock:
+            run = SimulationRun(str(next(self._ids)), participants, num_turns)
+            self.runs[run.id] = run
+            self._prune()
+        self.pool.submit(self._execute, run)
+        return run
+
+    def _prune(self):
+        """Drops the oldest finished runs beyond keep_finished. Call with _lock held."""
+        finished = sorted((r for r in self.runs.values() if r.done), key=lambda r: r.finished)
+        for run in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.runs[run.id]
+
+    def _execute(self, run):
+        run.set_status('running')
+        try:
+            for entry in run_simulation(run.participants, run.num_turns, cancel=run.cancel):
+                run.append(entry)
+            run.set_status('cancelled' if run.cancel.is_set() else 'done')
+        except Exception as e:
+            run.set_status('error', str(e))
+
+    def cancel(self, run_id):
+        run = self.runs.get(run_id)
+        if run is not None and not run.done:
+            run.cancel.set()
+        return run
+
+    def get(self, run_id):
+        return self.runs.get(run_id)
+
+    def list(self):
+        with self._lock:
+            runs = list(self.runs.values())
+        return sorted((r.summary() for r in runs), key=lambda r: r['created'], reverse=True)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# --- HTTP FRONT ---
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            parts = [p for p in self.path.split('/') if p]
+            if len(parts) == 3 and parts[0] == 'runs' and parts[2] == 'cancel':
+                run = service.cancel(parts[1])
+                if run is None: return self._send_json({'error': 'not found'}, 404)
+                return self._send_json(run.summary())
+            if parts != ['runs']:
+                return self._send_json({'error': 'not found'}, 404)
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                participants = list(request['participants'])
+                num_turns = int(request.get('num_turns', 3))
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send_json({'error': f"bad request: {e}"}, 400)
+            if len(participants) < 2:
+                return self._send_json({'error': 'at least two participants are required'}, 400)
+            run = service.start(participants, num_turns)
+            self._send_json(run.summary(), 201)
+
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            parts = [p for p in url.path.split('/') if p]
+            if parts == ['runs']:
+                return self._send_json(service.list())
+            if parts == ['metrics']:
+                return self._send_json({'admission': controller.metrics(), 'router': get_router().metrics()})
+            if len(parts) < 2 or parts[0] != 'runs' or service.get(parts[1]) is None:
+                return self._send_json({'error': 'not found'}, 404)
+            run = service.get(parts[1])
+            if len(parts) == 3 and parts[2] == 'stream':
+                return self._stream(run)
+            if len(parts) != 2:
+                return self._send_json({'error': 'not found'}, 404)
+            query = urllib.parse.parse_qs(url.query)
+            try:
+                since = int(query.get('since', ['0'])[0])
+                wait = min(float(query.get('wait', ['0'])[0]), MAX_WAIT)
+                if since < 0 or not wait >= 0:
+                    raise ValueError("'since' and 'wait' must not be negative")
+            except ValueError as e:
+                return self._send_json({'error': f"bad request: {e}"}, 400)
+            entries, status = run.wait_for(since, wait)
+            self._send_json({**run.summary(), 'status': status, 'since': since, 'items': entries})
+
+        def _stream(self, run):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            since = 0
+            try:
+                while True:
+                    entries, status = run.wait_for(since, MAX_WAIT)
+                    for entry in entries:
+                        line = json.dumps(entry).encode() + b'\n'
+                        self.wfile.write(f"{len(line):X}\r\n".encode() + line + b'\r\n')
+                    self.wfile.flush()
+                    since += len(entries)
+                    if status in FINISHED and since >= len(run.entries): break
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, max_workers=4):
+    service = SimulationService(max_workers=max_workers)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    print(f"Simulation service listening on http://{host}:{port} ({max_workers} workers). Press Ctrl-C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nService shutting down. Goodbye!")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+# --- CLIENT ---
+class ServiceClient:
+    """What app.py uses to talk to the service."""
+    def __init__(self, base_url=DEFAULT_SERVICE_URL, timeout=5):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, payload=None, timeout=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data,
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+            return json.loads(response.read())
+
+    def is_available(self):
+        try:
+            self._request('/runs')
+            return True
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def start_run(self, participants, num_turns):
+        return self._request('/runs', {'participants': participants, 'num_turns': num_turns})
+
+    def cancel_run(self, run_id):
+        return self._request(f"/runs/{run_id}/cancel", {})
+
+    def list_runs(self):
+        return self._request('/runs')
+
+    def poll(self, run_id, since=0, wait=0):
+        return self._request(f"/runs/{run_id}?since={since}&wait={wait}", timeout=self.timeout + wait)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve simulations to any number of viewers.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
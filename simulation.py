@@ -0,0 +1,153 @@
+import random
+import time
+
+from admission import PRIORITY_INIT
+from config import config
+from core import load_persona
+from mainr import get_ai_response
+from router import TASK_CHOICE, TASK_POST
+from selection import SelectionEngine, STYLE, TACTIC
+from topics import default_scheduler
+
+# --- SIMULATION CORE ---
+# The one conversation generator behind app.py (through service.py), the mainr
+# CLI and batch.py. It never sleeps and never touches a UI: every step is
+# yielded as a typed event dict and the consumer decides how to show, store or
+# pace it. Nothing runs ahead of the consumer, so a slow reader holds the
+# simulation back instead of piling up events, and the run stops cleanly when
+# `cancel` is set or the generator is closed.
+#
+# Every event has 'type', 'author' and 'text'. Moderator-side events (topic,
+# choices, timing, errors) use the author 'MODERATOR'.
+
+EVENT_MODERATOR = 'moderator'   # topic announcements and other moderator remarks
+EVENT_POST = 'post'             # the opening post ('is_post': True)
+EVENT_STYLE = 'style'           # a participant's reply style ('persona', 'choice', 'logical')
+EVENT_TACTIC = 'tactic'         # a participant's tactic ('persona', 'choice', 'logical')
+EVENT_REPLY = 'reply'           # a reply to the thread
+EVENT_TIMING = 'timing'         # seconds spent on one step ('step', 'seconds')
+EVENT_ERROR = 'error'           # the run could not continue ('is_error': True)
+
+
+def _event(kind, author, text, **fields):
+    return {'type': kind, 'author': author, 'text': text, **fields}
+
+def _timing(step, started):
+    seconds = round(time.perf_counter() - started, 3)
+    return _event(EVENT_TIMING, 'MODERATOR', f"<{step} took {seconds:.2f}s>", step=step, seconds=seconds)
+
+
+def run_simulation(participants, num_turns, topic_data=None, seed=None, cancel=None, tactic_cooldown=None):
+    """
+    Runs the simulation and yields each step as an event as it happens.
+    `topic_data` ({'subreddit', 'topic'}) skips the scheduler, `seed` makes the
+    random choices repeatable and `cancel` (anything with is_set()) stops the
+    run between model calls.
+    """
+    if tactic_cooldown is None: tactic_cooldown = config['simulation.tactic_cooldown']
+    rng = random.Random(seed)
+    run_started = time.perf_counter()
+    cancelled = lambda: cancel is not None and cancel.is_set()
+
+    # MODERATOR: PICK A TOPIC
+    try:
+        topic_data = topic_data or default_scheduler().pick()
+        subreddit = topic_data['subreddit']
+        topic = topic_data['topic']
+        yield _event(EVENT_MODERATOR, 'MODERATOR', f"Today's discussion is in **{subreddit}** on the topic: *{topic}*",
+                     subreddit=subreddit, topic=topic)
+    except Exception as e:
+        yield _event(EVENT_ERROR, 'MODERATOR', f"Error loading topics: {e}", is_error=True); return
+
+    # LOAD PARTICIPANTS
+    personas = [load_persona(name) for name in participants]
+    if any(p is None for p in personas):
+        yield _event(EVENT_ERROR, 'MODERATOR', "One or more personas could not be loaded.", is_error=True); return
+
+    # Styles have no cooldown in a one-off conversation; tactics cool down for `tactic_cooldown` turns
+    selection = SelectionEngine.from_personas(personas, style_cooldown=0, tactic_cooldown=tactic_cooldown)
+
+    # RANDOMLY SELECT FIRST POSTER
+    first_poster = rng.choice(personas)
+    post_prompt = f"You are starting a new thread in {subreddit} on the topic: '{topic}'. Write a concise opening post."
+    started = time.perf_counter()
+    initial_post = get_ai_response(first_poster, post_prompt, use_full_backstory=True, priority=PRIORITY_INIT, task=TASK_POST)
+    if initial_post is None:
+        yield _event(EVENT_ERROR, 'MODERATOR', "The opening post could not be generated.", is_error=True); return
+    yield _event(EVENT_POST, first_poster['name'], initial_post, is_post=True)
+    yield _timing('post', started)
+
+    conversation_thread = [f"[POST by {first_poster['name']}]: {initial_post}"]
+
+    # DYNAMIC TURN-TAKING LOOP (smart/impulsive choices)
+    turn_index = personas.index(first_poster)
+    for turn in range(num_turns * len(personas)):
+        if cancelled():
+            yield _event(EVENT_MODERATOR, 'MODERATOR', "<The simulation was stopped>", cancelled=True); return
+        started = time.perf_counter()
+        turn_index = (turn_index + 1) % len(personas)
+        current_commenter_persona = personas[turn_index]
+        persona_name = current_commenter_persona['name']
+
+        # STEP 1: CHOOSE REPLY STYLE (65% Impulsive, 35% Logical by default)
+        if rng.random() < config['simulation.impulsive_style_chance']:
+            chosen_style = selection.choose(persona_name, STYLE, rng)
+            yield _event(EVENT_STYLE, 'MODERATOR', f"<{persona_name} impulsively chooses style: {chosen_style}>",
+                         persona=persona_name, choice=chosen_style, logical=False)
+        else:
+            last_message = conversation_thread[-1]
+            style_prompt = (
+                f"Given the last comment was: \"{last_message[:200]}...\"\n"
+                f"Which of these reply styles is the most logical choice for you? {selection.available(persona_name, STYLE)}\n"
+                "Just simply choose ONE option from the list, no need to explain why."
+            )
+            chosen_style = get_ai_response(current_commenter_persona, style_prompt, use_full_backstory=False, task=TASK_CHOICE)
+            if chosen_style is None:
+                chosen_style = selection.choose(persona_name, STYLE, rng)
+            else:
+                selection.record(persona_name, STYLE, chosen_style)
+            yield _event(EVENT_STYLE, 'MODERATOR', f"<{persona_name} logically chooses style: {chosen_style}>",
+                         persona=persona_name, choice=chosen_style, logical=True)
+
+        # STEP 2: CHOOSE TACTIC (50% Impulsive, 50% Logical by default) with cooldown
+        if rng.random() < config['simulation.impulsive_tactic_chance']:
+            chosen_tactic = selection.choose(persona_name, TACTIC, rng)
+            yield _event(EVENT_TACTIC, 'MODERATOR', f"<{persona_name} impulsively chooses tactic: {chosen_tactic}>",
+                         persona=persona_name, choice=chosen_tactic, logical=False)
+        else:
+            if cancelled(): continue
+            tactic_prompt = (
+                f"Your chosen reply style will be '{chosen_style}'.\nGiven the last comment, which of these tactics is the most logical choice for you? {selection.available(persona_name, TACTIC)}\n"
+                "Just simply choose ONE option from the list, no need to explain why"
+            )
+            chosen_tactic = get_ai_response(current_commenter_persona, tactic_prompt, use_full_backstory=False, task=TASK_CHOICE)
+            if chosen_tactic is None:
+                chosen_tactic = selection.choose(persona_name, TACTIC, rng)
+            else:
+                selection.record(persona_name, TACTIC, chosen_tactic)
+            yield _event(EVENT_TACTIC, 'MODERATOR', f"<{persona_name} logically chooses tactic: {chosen_tactic}>",
+                         persona=persona_name, choice=chosen_tactic, logical=True)
+
+        # STEP 3: GENERATE THE FINAL REPLY
+        if cancelled(): continue
+        thread_context = "\n".join(conversation_thread)
+        memory_recall_instruction = ""
+        use_full_backstory = False
+        if isinstance(chosen_tactic, str) and "anecdote" in chosen_tactic.lower():
+            memory_recall_instruction = "If required you can briefly reference your personal backstory to make your point."
+            use_full_backstory = True
+
+        reply_prompt = (
+            f"The conversation so far:\n{thread_context}\n\nYour Task: Write a reply.\n"
+            f"- Style: {chosen_style}\n- Tactic: {chosen_tactic}\n- {memory_recall_instruction}\n- CRUCIALLY, you MUST reflect your specific voice."
+        )
+
+        reply = get_ai_response(current_commenter_persona, reply_prompt, use_full_backstory=use_full_backstory)
+        if reply is None:
+            yield _event(EVENT_MODERATOR, 'MODERATOR', f"<{persona_name} has nothing to say this turn>")
+        else:
+            yield _event(EVENT_REPLY, persona_name, reply)
+            conversation_thread.append(f"[REPLY by {persona_name}]: {reply}")
+        yield _timing(f"turn {turn + 1}", started)
+
+    yield _timing('simulation', run_started)
@@ -0,0 +1,941 @@
+import bisect
+import heapq
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from clock import now_us, to_micros, format_micros
+from config import config
+from search import ensure_search_index, search_content, to_match_query, HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE
+
+# --- STORAGE BACKENDS ---
+# All reads and writes of posts, comments, the inbox and the feed go through
+# one of these classes, so the engine and the viewer never build SQL themselves.
+# Pick a backend with get_storage('sqlite') or get_storage('memory').
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'world.db')
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subreddit TEXT NOT NULL,
+        author_name TEXT NOT NULL,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        archived INTEGER DEFAULT 0,
+        created_us INTEGER
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id INTEGER NOT NULL,
+        author_name TEXT NOT NULL,
+        content TEXT NOT NULL,
+        parent_comment_id INTEGER,
+        is_read INTEGER DEFAULT 0,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        created_us INTEGER,
+        FOREIGN KEY (post_id) REFERENCES posts (id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS thread_summaries (
+        post_id INTEGER NOT NULL,
+        node_id INTEGER NOT NULL,
+        comments INTEGER NOT NULL,
+        depth INTEGER NOT NULL,
+        participants TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        PRIMARY KEY (post_id, node_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS relationship_scores (
+        source TEXT NOT NULL,
+        target TEXT NOT NULL,
+        score REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (source, target)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS applied_writes (
+        key TEXT PRIMARY KEY,
+        kind TEXT,
+        row_id INTEGER,
+        applied_us INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS selection_history (
+        persona TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        turn INTEGER NOT NULL,
+        choice TEXT NOT NULL,
+        PRIMARY KEY (persona, kind, slot)
+    )
+    ''',
+]
+
+# Rows are ordered by created_us, integer microseconds from clock.now_us(). Rows that
+# predate the column get the second of their timestamp plus their id, which keeps
+# their old order; rows inserted without it (older scripts) get SQLite's clock.
+SQL_NOW_US = "(CAST(strftime('%s', 'now') AS INTEGER) * 1000000 + CAST(substr(strftime('%f', 'now'), 4) AS INTEGER) * 1000)"
+BACKFILL_CREATED_US = "UPDATE {table} SET created_us = CAST(strftime('%s', timestamp) AS INTEGER) * 1000000 + id % 1000000 WHERE created_us IS NULL"
+
+# Columns added after a table was first shipped: (table, column, definition, backfill statement or None)
+COLUMN_MIGRATIONS = [
+    ('posts', 'archived', 'INTEGER DEFAULT 0', None),
+    ('posts', 'created_us', 'INTEGER', BACKFILL_CREATED_US.format(table='posts')),
+    ('comments', 'created_us', 'INTEGER', BACKFILL_CREATED_US.format(table='comments')),
+    ('posts', 'topic', 'TEXT', None),
+]
+
+# Statements that need the migrated columns
+ORDERING_SCHEMA = [
+    'DROP INDEX IF EXISTS idx_posts_subreddit_time',
+    'DROP INDEX IF EXISTS idx_comments_post_time',
+    'CREATE INDEX IF NOT EXISTS idx_posts_subreddit_created ON posts (subreddit, created_us, id)',
+    'CREATE INDEX IF NOT EXISTS idx_comments_post_created ON comments (post_id, created_us, id)',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS posts_created_us AFTER INSERT ON posts WHEN new.created_us IS NULL BEGIN
+        UPDATE posts SET created_us = {SQL_NOW_US} WHERE id = new.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS comments_created_us AFTER INSERT ON comments WHEN new.created_us IS NULL BEGIN
+        UPDATE comments SET created_us = {SQL_NOW_US} WHERE id = new.id;
+    END
+    ''',
+]
+
+# Per-subreddit and per-topic counts kept up to date by triggers, so listing
+# subreddits and weighing topics never scans the posts and comments tables.
+# Only posts written with a topic (the engine's, since posts.topic exists) count
+# towards topic_stats.
+SUMMARY_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS subreddit_stats (
+        subreddit TEXT PRIMARY KEY,
+        posts INTEGER NOT NULL DEFAULT 0,
+        comments INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS subreddit_stats_post_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO subreddit_stats (subreddit, posts) VALUES (new.subreddit, 1)
+        ON CONFLICT (subreddit) DO UPDATE SET posts = posts + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS subreddit_stats_post_delete AFTER DELETE ON posts BEGIN
+        UPDATE subreddit_stats SET posts = posts - 1 WHERE subreddit = old.subreddit;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS subreddit_stats_comment_insert AFTER INSERT ON comments BEGIN
+        UPDATE subreddit_stats SET comments = comments + 1
+        WHERE subreddit = (SELECT subreddit FROM posts WHERE id = new.post_id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS subreddit_stats_comment_delete AFTER DELETE ON comments BEGIN
+        UPDATE subreddit_stats SET comments = comments - 1
+        WHERE subreddit = (SELECT subreddit FROM posts WHERE id = old.post_id);
+    END
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS topic_stats (
+        subreddit TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        posts INTEGER NOT NULL DEFAULT 0,
+        comments INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (subreddit, topic)
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS topic_stats_post_insert AFTER INSERT ON posts WHEN new.topic IS NOT NULL BEGIN
+        INSERT INTO topic_stats (subreddit, topic, posts) VALUES (new.subreddit, new.topic, 1)
+        ON CONFLICT (subreddit, topic) DO UPDATE SET posts = posts + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS topic_stats_post_delete AFTER DELETE ON posts WHEN old.topic IS NOT NULL BEGIN
+        UPDATE topic_stats SET posts = posts - 1 WHERE subreddit = old.subreddit AND topic = old.topic;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS topic_stats_comment_insert AFTER INSERT ON comments BEGIN
+        UPDATE topic_stats SET comments = comments + 1
+        WHERE (subreddit, topic) = (SELECT subreddit, topic FROM posts WHERE id = new.post_id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS topic_stats_comment_delete AFTER DELETE ON comments BEGIN
+        UPDATE topic_stats SET comments = comments - 1
+        WHERE (subreddit, topic) = (SELECT subreddit, topic FROM posts WHERE id = old.post_id);
+    END
+    ''',
+]
+
+
+POST_COLUMNS = ('id', 'subreddit', 'author_name', 'title', 'content', 'timestamp', 'archived', 'created_us')
+COMMENT_COLUMNS = ('id', 'post_id', 'author_name', 'content', 'parent_comment_id', 'is_read', 'timestamp', 'created_us')
+SUMMARY_COLUMNS = ('post_id', 'node_id', 'comments', 'depth', 'participants', 'digest')
+
+
+class Row(tuple):
+    """A tuple that can also be indexed by column name, like sqlite3.Row."""
+    def __new__(cls, columns, values):
+        row = super().__new__(cls, values)
+        row._index = {name: i for i, name in enumerate(columns)}
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._index)
+
+
+class StorageBackend:
+    """The queries the engine and the viewer need. Subclasses implement every method."""
+    name = 'base'
+
+    def add_post(self, subreddit, author, title, content, topic=None):
+        """`topic` is the scheduler topic the post was written about, counted in get_topic_stats()."""
+        raise NotImplementedError
+
+    def add_comment(self, post_id, author, content, parent_comment_id=None):
+        raise NotImplementedError
+
+    def mark_comment_as_read(self, comment_id):
+        raise NotImplementedError
+
+    def apply_write(self, key, kind, fields, mark_read=None):
+        """Applies one journaled write at most once per `key`, in a single transaction:
+        inserts a 'post' (subreddit, author_name, title, content, optional topic) or 'comment' (post_id,
+        author_name, content, parent_comment_id), or nothing if `kind` is None, and marks
+        comment `mark_read` as read. Returns (row id, True), (row id, False) if `key` was
+        applied before, or None on error."""
+        raise NotImplementedError
+
+    def get_feed(self, subreddits, exclude_author, limit=10):
+        """Most recent live (not archived) posts in `subreddits` not written by `exclude_author`."""
+        raise NotImplementedError
+
+    def get_unread_notification(self, author):
+        """Most recent unread comment by someone else on one of `author`'s live posts."""
+        raise NotImplementedError
+
+    def archive_stale_threads(self, max_age_seconds, max_comments):
+        """Archives live posts older than `max_age_seconds` or with `max_comments` comments.
+        Returns how many were archived."""
+        raise NotImplementedError
+
+    def get_recent_comments(self, post_id, limit=10):
+        raise NotImplementedError
+
+    def get_active_subreddits(self):
+        raise NotImplementedError
+
+    def get_posts_for_subreddit(self, subreddit):
+        raise NotImplementedError
+
+    def get_subreddit_stats(self):
+        """(subreddit, posts, comments) for every subreddit with posts."""
+        raise NotImplementedError
+
+    def get_topic_stats(self):
+        """(subreddit, topic, posts, comments) for every topic posts were written about."""
+        raise NotImplementedError
+
+    def get_posts_page(self, subreddit, before=None, limit=10):
+        """One page of a subreddit, newest first. `before` is the (created_us, id) of the
+        last post on the previous page; pass None for the first page."""
+        raise NotImplementedError
+
+    def get_post(self, post_id):
+        raise NotImplementedError
+
+    def get_comments_for_post(self, post_id):
+        """Every comment on a post, oldest first."""
+        raise NotImplementedError
+
+    def get_comment_parents(self, post_id):
+        """{comment id: parent comment id} for every comment on a post, without the text."""
+        raise NotImplementedError
+
+    def get_high_water(self):
+        """A value that changes whenever a post or comment is added."""
+        raise NotImplementedError
+
+    def iter_comments_after(self, comment_id, limit=500):
+        """Comments with id > `comment_id` in id order, with the author of their post."""
+        raise NotImplementedError
+
+    def get_posts_after(self, post_id, limit=1000, until_id=None):
+        """Full post rows with `post_id` < id <= `until_id`, in id order."""
+        raise NotImplementedError
+
+    def get_comments_after(self, comment_id, limit=1000, until_id=None):
+        """Full comment rows with `comment_id` < id <= `until_id`, in id order."""
+        raise NotImplementedError
+
+    def search(self, text, author=None, subreddit=None, since=None, until=None, limit=20):
+        """Ranked posts and comments matching `text`, with a highlighted snippet each.
+        `since` and `until` are inclusive bounds accepted by clock.to_micros."""
+        raise NotImplementedError
+
+    def get_thread_summaries(self, post_id, node_ids=None):
+        """Stored subtree summaries of a thread (node 0 is the whole thread), optionally only `node_ids`."""
+        raise NotImplementedError
+
+    def save_thread_summaries(self, rows):
+        """Upserts rows in SUMMARY_COLUMNS order."""
+        raise NotImplementedError
+
+    def load_relationship_scores(self):
+        """Saved (source, target, score) rows."""
+        raise NotImplementedError
+
+    def save_relationship_scores(self, rows):
+        """Upserts (source, target, score) rows."""
+        raise NotImplementedError
+
+    def load_selection_history(self):
+        """Saved (persona, kind, slot, turn, choice) cooldown rows (see selection.py)."""
+        raise NotImplementedError
+
+    def save_selection_history(self, rows):
+        """Upserts (persona, kind, slot, turn, choice) rows."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# --- SQLITE BACKEND ---
+class SQLiteStorage(StorageBackend):
+    name = 'sqlite'
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DEFAULT_DB_PATH
+        self._conn = None
+        self._lock = threading.RLock()
+
+    def connect(self):
+        """Opens (once) the shared connection and makes sure the schema exists."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')     # readers never block the engine's writes
+            for statement in SCHEMA:
+                conn.execute(statement)
+            for table, column, definition, backfill in COLUMN_MIGRATIONS:
+                columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                    if backfill: conn.execute(backfill)
+            for statement in ORDERING_SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            ensure_summary_table(conn)
+            ensure_search_index(conn)
+            self._conn = conn
+        return self._conn
+
+    def execute_query(self, query, params=(), fetch=None):
+        try:
+            with self._lock:
+                conn = self.connect()
+                cursor = conn.execute(query, params)
+                if fetch == 'one': return cursor.fetchone()
+                if fetch == 'all': return cursor.fetchall()
+                conn.commit()
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+
+    def add_post(self, subreddit, author, title, content, topic=None):
+        created = now_us()
+        query = "INSERT INTO posts (subreddit, author_name, title, content, timestamp, created_us, topic) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        return self.execute_query(query, (subreddit, author, title, content, format_micros(created), created, topic))
+
+    def add_comment(self, post_id, author, content, parent_comment_id=None):
+        created = now_us()
+        query = "INSERT INTO comments (post_id, author_name, content, parent_comment_id, timestamp, created_us) VALUES (?, ?, ?, ?, ?, ?)"
+        return self.execute_query(query, (post_id, author, content, parent_comment_id, format_micros(created), created))
+
+    def mark_comment_as_read(self, comment_id):
+        self.execute_query("UPDATE comments SET is_read = 1 WHERE id = ?", (comment_id,))
+
+    def apply_write(self, key, kind, fields, mark_read=None):
+        try:
+            with self._lock:
+                conn = self.connect()
+                with conn:      # one transaction: committed together or rolled back together
+                    done = conn.execute("SELECT row_id FROM applied_writes WHERE key = ?", (key,)).fetchone()
+                    if done is not None: return done['row_id'], False
+                    created = now_us()
+                    row_id = None
+                    if kind == 'post':
+                        row_id = conn.execute(
+                            "INSERT INTO posts (subreddit, author_name, title, content, timestamp, created_us, topic) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (fields['subreddit'], fields['author_name'], fields['title'], fields['content'],
+                             format_micros(created), created, fields.get('topic'))).lastrowid
+                    elif kind == 'comment':
+                        row_id = conn.execute(
+                            "INSERT INTO comments (post_id, author_name, content, parent_comment_id, timestamp, created_us) VALUES (?, ?, ?, ?, ?, ?)",
+                            (fields['post_id'], fields['author_name'], fields['content'], fields.get('parent_comment_id'),
+                             format_micros(created), created)).lastrowid
+                    if mark_read is not None:
+                        conn.execute("UPDATE comments SET is_read = 1 WHERE id = ?", (mark_read,))
+                    conn.execute("INSERT INTO applied_writes (key, kind, row_id, applied_us) VALUES (?, ?, ?, ?)",
+                                 (key, kind, row_id, created))
+                return row_id, True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+
+    def get_feed(self, subreddits, exclude_author, limit=10):
+        if not subreddits: return []
+        placeholders = ', '.join('?' for _ in subreddits)
+        query = f"SELECT id, author_name, title, content FROM posts WHERE subreddit IN ({placeholders}) AND author_name != ? AND archived = 0 ORDER BY created_us DESC, id DESC LIMIT ?"
+        return self.execute_query(query, tuple(subreddits) + (exclude_author, limit), fetch='all') or []
+
+    def get_unread_notification(self, author):
+        query = """
+            SELECT c.id, c.content, c.author_name, p.id as post_id, p.title
+            FROM comments c JOIN posts p ON c.post_id = p.id
+            WHERE p.author_name = ? AND c.author_name != ? AND c.is_read = 0 AND p.archived = 0
+            ORDER BY c.created_us DESC, c.id DESC LIMIT 1
+        """
+        return self.execute_query(query, (author, author), fetch='one')
+
+    def archive_stale_threads(self, max_age_seconds, max_comments):
+        query = """
+            UPDATE posts SET archived = 1
+            WHERE archived = 0 AND (created_us < ?
+                  OR (SELECT COUNT(*) FROM comments c WHERE c.post_id = posts.id) >= ?)
+        """
+        try:
+            with self._lock:
+                conn = self.connect()
+                cursor = conn.execute(query, (now_us() - int(max_age_seconds * 1_000_000), max_comments))
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return 0
+
+    def get_recent_comments(self, post_id, limit=10):
+        query = "SELECT id, author_name, content FROM comments WHERE post_id = ? ORDER BY created_us DESC, id DESC LIMIT ?"
+        return self.execute_query(query, (post_id, limit), fetch='all') or []
+
+    def get_active_subreddits(self):
+        rows = self.execute_query('SELECT subreddit FROM subreddit_stats WHERE posts > 0 ORDER BY subreddit ASC', fetch='all') or []
+        return [row['subreddit'] for row in rows]
+
+    def get_posts_for_subreddit(self, subreddit):
+        return self.execute_query('SELECT * FROM posts WHERE subreddit = ? ORDER BY created_us DESC, id DESC', (subreddit,), fetch='all') or []
+
+    def get_subreddit_stats(self):
+        query = 'SELECT subreddit, posts, comments FROM subreddit_stats WHERE posts > 0 ORDER BY subreddit ASC'
+        return self.execute_query(query, fetch='all') or []
+
+    def get_topic_stats(self):
+        query = 'SELECT subreddit, topic, posts, comments FROM topic_stats WHERE posts > 0 ORDER BY subreddit ASC, topic ASC'
+        return self.execute_query(query, fetch='all') or []
+
+    def get_posts_page(self, subreddit, before=None, limit=10):
+        if before is None:
+            query = 'SELECT * FROM posts WHERE subreddit = ? ORDER BY created_us DESC, id DESC LIMIT ?'
+            params = (subreddit, limit)
+        else:
+            query = """
+                SELECT * FROM posts WHERE subreddit = ? AND (created_us < ? OR (created_us = ? AND id < ?))
+                ORDER BY created_us DESC, id DESC LIMIT ?
+            """
+            params = (subreddit, before[0], before[0], before[1], limit)
+        return self.execute_query(query, params, fetch='all') or []
+
+    def get_high_water(self):
+        row = self.execute_query('SELECT (SELECT MAX(id) FROM posts), (SELECT MAX(id) FROM comments)', fetch='one')
+        return tuple(v or 0 for v in row) if row else (0, 0)
+
+    def get_post(self, post_id):
+        return self.execute_query('SELECT * FROM posts WHERE id = ?', (post_id,), fetch='one')
+
+    def get_comments_for_post(self, post_id):
+        return self.execute_query('SELECT * FROM comments WHERE post_id = ? ORDER BY created_us ASC, id ASC', (post_id,), fetch='all') or []
+
+    def get_comment_parents(self, post_id):
+        rows = self.execute_query('SELECT id, parent_comment_id FROM comments WHERE post_id = ?', (post_id,), fetch='all') or []
+        return {row['id']: row['parent_comment_id'] for row in rows}
+
+    def iter_comments_after(self, comment_id, limit=500):
+        query = """
+            SELECT c.id, c.post_id, c.author_name, c.parent_comment_id, p.author_name as post_author
+            FROM comments c JOIN posts p ON c.post_id = p.id
+            WHERE c.id > ? ORDER BY c.id ASC LIMIT ?
+        """
+        return self.execute_query(query, (comment_id, limit), fetch='all') or []
+
+    def get_posts_after(self, post_id, limit=1000, until_id=None):
+        query = 'SELECT * FROM posts WHERE id > ? AND id <= ? ORDER BY id ASC LIMIT ?'
+        return self.execute_query(query, (post_id, until_id if until_id is not None else 2 ** 63 - 1, limit), fetch='all') or []
+
+    def get_comments_after(self, comment_id, limit=1000, until_id=None):
+        query = 'SELECT * FROM comments WHERE id > ? AND id <= ? ORDER BY id ASC LIMIT ?'
+        return self.execute_query(query, (comment_id, until_id if until_id is not None else 2 ** 63 - 1, limit), fetch='all') or []
+
+    def search(self, text, author=None, subreddit=None, since=None, until=None, limit=20):
+        try:
+            with self._lock:
+                return search_content(self.connect(), text, author, subreddit, since, until, limit)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return []
+
+    def get_thread_summaries(self, post_id, node_ids=None):
+        query = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM thread_summaries WHERE post_id = ?"
+        params = (post_id,)
+        if node_ids is not None:
+            node_ids = list(node_ids)
+            if not node_ids: return []
+            query += f" AND node_id IN ({', '.join('?' for _ in node_ids)})"
+            params += tuple(node_ids)
+        return self.execute_query(query, params, fetch='all') or []
+
+    def save_thread_summaries(self, rows):
+        query = f"""
+            INSERT INTO thread_summaries ({', '.join(SUMMARY_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (post_id, node_id) DO UPDATE SET comments = excluded.comments, depth = excluded.depth,
+                participants = excluded.participants, digest = excluded.digest
+        """
+        try:
+            with self._lock:
+                conn = self.connect()
+                conn.executemany(query, rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+
+    def load_relationship_scores(self):
+        return self.execute_query('SELECT source, target, score FROM relationship_scores', fetch='all') or []
+
+    def save_relationship_scores(self, rows):
+        query = """
+            INSERT INTO relationship_scores (source, target, score) VALUES (?, ?, ?)
+            ON CONFLICT (source, target) DO UPDATE SET score = excluded.score
+        """
+        try:
+            with self._lock:
+                conn = self.connect()
+                conn.executemany(query, rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+
+    def load_selection_history(self):
+        return self.execute_query('SELECT persona, kind, slot, turn, choice FROM selection_history', fetch='all') or []
+
+    def save_selection_history(self, rows):
+        query = """
+            INSERT INTO selection_history (persona, kind, slot, turn, choice) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (persona, kind, slot) DO UPDATE SET turn = excluded.turn, choice = excluded.choice
+        """
+        try:
+            with self._lock:
+                conn = self.connect()
+                conn.executemany(query, rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def ensure_summary_table(conn):
+    """Creates the subreddit and topic summary tables and their triggers; fills subreddit_stats the first time."""
+    existing = conn.execute("SELECT name FROM sqlite_master WHERE name = 'subreddit_stats'").fetchone()
+    for statement in SUMMARY_SCHEMA:
+        conn.execute(statement)
+    if existing is None:
+        conn.execute("""
+            INSERT INTO subreddit_stats (subreddit, posts, comments)
+            SELECT p.subreddit, COUNT(DISTINCT p.id), COUNT(c.id)
+            FROM posts p LEFT JOIN comments c ON c.post_id = p.id GROUP BY p.subreddit
+        """)
+    conn.commit()
+
+
+# --- READ-ONLY READERS ---
+class ReadOnlyStorage(SQLiteStorage):
+    """An existing SQLite database opened read-only, for tools such as export.py that
+    read a database the engine may be writing. Nothing is created or migrated, and
+    any write fails with a database error."""
+    name = 'readonly'
+
+    def connect(self):
+        if self._conn is None:
+            uri = 'file:' + urllib.parse.quote(os.path.abspath(self.db_path)) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._conn = conn
+        return self._conn
+
+
+class SnapshotStorage(SQLiteStorage):
+    """Read-only view of a SQLite database served from an in-memory copy.
+
+    The copy is taken with the SQLite backup API and retaken at most every
+    `max_age` seconds, on the next read after it goes stale. Every read in
+    between sees the same point in time, and viewers never hold locks on the
+    file the engine is writing."""
+    name = 'snapshot'
+
+    def __init__(self, db_path=None, max_age=None):
+        super().__init__(db_path)
+        self.max_age = max_age if max_age is not None else config['db.snapshot_seconds']
+        self.source = SQLiteStorage(self.db_path)
+        self.taken_at = None
+
+    def refresh(self):
+        """Takes a fresh copy of the source database now."""
+        snapshot = sqlite3.connect(':memory:', check_same_thread=False)
+        snapshot.row_factory = sqlite3.Row
+        with self.source._lock:
+            self.source.connect().backup(snapshot)
+        with self._lock:
+            old, self._conn = self._conn, snapshot
+            self.taken_at = time.monotonic()
+        if old is not None: old.close()
+        return self.taken_at
+
+    def connect(self):
+        if self._conn is None or time.monotonic() - self.taken_at >= self.max_age:
+            self.refresh()
+        return self._conn
+
+    def execute_query(self, query, params=(), fetch=None):
+        if fetch is None:
+            print("Database error: snapshot storage is read-only")
+            return None
+        return super().execute_query(query, params, fetch)
+
+    def archive_stale_threads(self, max_age_seconds, max_comments):
+        print("Database error: snapshot storage is read-only")
+        return 0
+
+    def save_relationship_scores(self, rows):
+        print("Database error: snapshot storage is read-only")
+
+    def save_selection_history(self, rows):
+        print("Database error: snapshot storage is read-only")
+
+    def apply_write(self, key, kind, fields, mark_read=None):
+        print("Database error: snapshot storage is read-only")
+        return None
+
+    def save_thread_summaries(self, rows):
+        print("Database error: snapshot storage is read-only")
+
+    def close(self):
+        super().close()
+        self.source.close()
+
+
+# --- IN-MEMORY BACKEND ---
+class MemoryStorage(StorageBackend):
+    """Dict-backed storage with sorted (time, id) indexes. Nothing touches disk."""
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._posts = {}
+        self._comments = {}
+        self._next_post_id = 1
+        self._next_comment_id = 1
+        self._posts_by_subreddit = {}   # subreddit -> sorted [(created_us, post_id)]
+        self._live_by_subreddit = {}    # same, for posts that are not archived
+        self._comments_by_post = {}     # post_id -> [comment_id] in insertion order
+        self._comment_counts = {}       # subreddit -> comments on its posts
+        self._post_topics = {}          # post_id -> (subreddit, topic) for posts written with a topic
+        self._topic_stats = {}          # (subreddit, topic) -> [posts, comments]
+        self._unread_by_author = {}     # post author -> sorted [(created_us, comment_id)]
+        self._thread_summaries = {}     # post_id -> {node_id: summary row}
+        self._relationship_scores = {}  # (source, target) -> score
+        self._selection_history = {}    # (persona, kind, slot) -> (turn, choice)
+        self._applied_writes = {}       # journal key -> row id
+
+    @staticmethod
+    def _now():
+        created = now_us()
+        return created, format_micros(created)
+
+    def add_post(self, subreddit, author, title, content, topic=None):
+        with self._lock:
+            post_id = self._next_post_id
+            self._next_post_id += 1
+            ts, stamp = self._now()
+            self._posts[post_id] = {'id': post_id, 'subreddit': subreddit, 'author_name': author,
+                                    'title': title, 'content': content, 'timestamp': stamp, 'archived': 0, 'created_us': ts}
+            bisect.insort(self._posts_by_subreddit.setdefault(subreddit, []), (ts, post_id))
+            bisect.insort(self._live_by_subreddit.setdefault(subreddit, []), (ts, post_id))
+            if topic is not None:
+                self._post_topics[post_id] = (subreddit, topic)
+                self._topic_stats.setdefault((subreddit, topic), [0, 0])[0] += 1
+            return post_id
+
+    def add_comment(self, post_id, author, content, parent_comment_id=None):
+        with self._lock:
+            post = self._posts.get(post_id)
+            if post is None:
+                print(f"Database error: post {post_id} does not exist")
+                return None
+            comment_id = self._next_comment_id
+            self._next_comment_id += 1
+            ts, stamp = self._now()
+            self._comments[comment_id] = {'id': comment_id, 'post_id': post_id, 'author_name': author,
+                                          'content': content, 'parent_comment_id': parent_comment_id,
+                                          'is_read': 0, 'timestamp': stamp, 'created_us': ts}
+            self._comments_by_post.setdefault(post_id, []).append(comment_id)
+            self._comment_counts[post['subreddit']] = self._comment_counts.get(post['subreddit'], 0) + 1
+            if post_id in self._post_topics:
+                self._topic_stats[self._post_topics[post_id]][1] += 1
+            if post['author_name'] != author:
+                bisect.insort(self._unread_by_author.setdefault(post['author_name'], []), (ts, comment_id))
+            return comment_id
+
+    def mark_comment_as_read(self, comment_id):
+        with self._lock:
+            comment = self._comments.get(comment_id)
+            if comment is None or comment['is_read']: return
+            comment['is_read'] = 1
+            post_author = self._posts[comment['post_id']]['author_name']
+            inbox = self._unread_by_author.get(post_author, [])
+            i = bisect.bisect_left(inbox, (comment['created_us'], comment_id))
+            if i < len(inbox) and inbox[i][1] == comment_id:
+                del inbox[i]
+
+    def apply_write(self, key, kind, fields, mark_read=None):
+        with self._lock:
+            if key in self._applied_writes: return self._applied_writes[key], False
+            row_id = None
+            if kind == 'post':
+                row_id = self.add_post(fields['subreddit'], fields['author_name'], fields['title'], fields['content'],
+                                       fields.get('topic'))
+            elif kind == 'comment':
+                row_id = self.add_comment(fields['post_id'], fields['author_name'], fields['content'],
+                                          fields.get('parent_comment_id'))
+                if row_id is None: return None
+            if mark_read is not None:
+                self.mark_comment_as_read(mark_read)
+            self._applied_writes[key] = row_id
+            return row_id, True
+
+    def get_feed(self, subreddits, exclude_author, limit=10):
+        with self._lock:
+            indexes = [reversed(self._live_by_subreddit.get(sub, [])) for sub in set(subreddits)]
+            rows = []
+            for _, post_id in heapq.merge(*indexes, reverse=True):
+                post = self._posts[post_id]
+                if post['author_name'] == exclude_author: continue
+                rows.append(Row(('id', 'author_name', 'title', 'content'),
+                                (post['id'], post['author_name'], post['title'], post['content'])))
+                if len(rows) >= limit: break
+            return rows
+
+    def get_unread_notification(self, author):
+        with self._lock:
+            for _, comment_id in reversed(self._unread_by_author.get(author, [])):
+                comment = self._comments[comment_id]
+                post = self._posts[comment['post_id']]
+                if post['archived']: continue
+                return Row(('id', 'content', 'author_name', 'post_id', 'title'),
+                           (comment['id'], comment['content'], comment['author_name'], post['id'], post['title']))
+            return None
+
+    def archive_stale_threads(self, max_age_seconds, max_comments):
+        with self._lock:
+            cutoff = now_us() - int(max_age_seconds * 1_000_000)
+            archived = 0
+            for index in self._live_by_subreddit.values():
+                keep = []
+                for created, post_id in index:
+                    post = self._posts[post_id]
+                    if created < cutoff or len(self._comments_by_post.get(post_id, [])) >= max_comments:
+                        post['archived'] = 1
+                        archived += 1
+                    else:
+                        keep.append((created, post_id))
+                index[:] = keep
+            return archived
+
+    def get_recent_comments(self, post_id, limit=10):
+        with self._lock:
+            ids = self._comments_by_post.get(post_id, [])[-limit:]
+            return [Row(('id', 'author_name', 'content'),
+                        (self._comments[cid]['id'], self._comments[cid]['author_name'], self._comments[cid]['content']))
+                    for cid in reversed(ids)]
+
+    def get_active_subreddits(self):
+        with self._lock:
+            return sorted(sub for sub, index in self._posts_by_subreddit.items() if index)
+
+    def get_posts_for_subreddit(self, subreddit):
+        with self._lock:
+            return [self._row(self._posts[pid], POST_COLUMNS)
+                    for _, pid in reversed(self._posts_by_subreddit.get(subreddit, []))]
+
+    def get_subreddit_stats(self):
+        with self._lock:
+            return [Row(('subreddit', 'posts', 'comments'),
+                        (sub, len(index), self._comment_counts.get(sub, 0)))
+                    for sub, index in sorted(self._posts_by_subreddit.items()) if index]
+
+    def get_topic_stats(self):
+        with self._lock:
+            return [Row(('subreddit', 'topic', 'posts', 'comments'), (sub, topic, posts, comments))
+                    for (sub, topic), (posts, comments) in sorted(self._topic_stats.items()) if posts]
+
+    def get_posts_page(self, subreddit, before=None, limit=10):
+        with self._lock:
+            index = self._posts_by_subreddit.get(subreddit, [])
+            end = len(index) if before is None else bisect.bisect_left(index, tuple(before))
+            return [self._row(self._posts[pid], POST_COLUMNS) for _, pid in reversed(index[max(0, end - limit):end])]
+
+    def get_high_water(self):
+        with self._lock:
+            return (self._next_post_id - 1, self._next_comment_id - 1)
+
+    def get_post(self, post_id):
+        with self._lock:
+            post = self._posts.get(post_id)
+            return self._row(post, POST_COLUMNS) if post else None
+
+    def get_comments_for_post(self, post_id):
+        with self._lock:
+            return [self._row(self._comments[cid], COMMENT_COLUMNS)
+                    for cid in self._comments_by_post.get(post_id, [])]
+
+    def get_comment_parents(self, post_id):
+        with self._lock:
+            return {cid: self._comments[cid]['parent_comment_id'] for cid in self._comments_by_post.get(post_id, [])}
+
+    def iter_comments_after(self, comment_id, limit=500):
+        with self._lock:
+            rows = []
+            for cid in range(comment_id + 1, self._next_comment_id):
+                comment = self._comments.get(cid)
+                if comment is None: continue
+                rows.append(Row(('id', 'post_id', 'author_name', 'parent_comment_id', 'post_author'),
+                                (cid, comment['post_id'], comment['author_name'], comment['parent_comment_id'],
+                                 self._posts[comment['post_id']]['author_name'])))
+                if len(rows) >= limit: break
+            return rows
+
+    def get_posts_after(self, post_id, limit=1000, until_id=None):
+        with self._lock:
+            end = self._next_post_id if until_id is None else min(until_id + 1, self._next_post_id)
+            rows = []
+            for pid in range(post_id + 1, end):
+                if pid in self._posts:
+                    rows.append(self._row(self._posts[pid], POST_COLUMNS))
+                    if len(rows) >= limit: break
+            return rows
+
+    def get_comments_after(self, comment_id, limit=1000, until_id=None):
+        with self._lock:
+            end = self._next_comment_id if until_id is None else min(until_id + 1, self._next_comment_id)
+            rows = []
+            for cid in range(comment_id + 1, end):
+                if cid in self._comments:
+                    rows.append(self._row(self._comments[cid], COMMENT_COLUMNS))
+                    if len(rows) >= limit: break
+            return rows
+
+    def search(self, text, author=None, subreddit=None, since=None, until=None, limit=20):
+        # No index here: a linear scan is fine for the test and benchmark sizes this backend serves
+        words = [w.strip('"*').lower() for w in to_match_query(text).split()]
+        if not words: return []
+        columns = ('kind', 'id', 'post_id', 'subreddit', 'author_name', 'title', 'timestamp', 'snippet', 'rank')
+        with self._lock:
+            hits = []
+            for kind, records in (('post', self._posts.values()), ('comment', self._comments.values())):
+                for record in records:
+                    post = record if kind == 'post' else self._posts[record['post_id']]
+                    if author and record['author_name'] != author: continue
+                    if subreddit and post['subreddit'] != subreddit: continue
+                    if since is not None and record['created_us'] < to_micros(since): continue
+                    if until is not None and record['created_us'] > to_micros(until): continue
+                    text_lower = (record.get('title', '') + ' ' + record['content']).lower()
+                    if not all(w in text_lower for w in words): continue
+                    count = sum(text_lower.count(w) for w in words)
+                    snippet = record['content']
+                    for w in set(words):
+                        snippet = re.sub(f"({re.escape(w)})", f"{HIGHLIGHT_OPEN}\\1{HIGHLIGHT_CLOSE}", snippet, flags=re.IGNORECASE)
+                    hits.append(Row(columns, (kind, record['id'], post['id'], post['subreddit'], record['author_name'],
+                                              post['title'], record['timestamp'], snippet, -count)))
+            return sorted(hits, key=lambda row: row['rank'])[:limit]
+
+    def get_thread_summaries(self, post_id, node_ids=None):
+        with self._lock:
+            nodes = self._thread_summaries.get(post_id, {})
+            if node_ids is None: return list(nodes.values())
+            return [nodes[n] for n in node_ids if n in nodes]
+
+    def save_thread_summaries(self, rows):
+        with self._lock:
+            for row in rows:
+                self._thread_summaries.setdefault(row[0], {})[row[1]] = Row(SUMMARY_COLUMNS, tuple(row))
+
+    def load_relationship_scores(self):
+        with self._lock:
+            return [Row(('source', 'target', 'score'), (source, target, score))
+                    for (source, target), score in self._relationship_scores.items()]
+
+    def save_relationship_scores(self, rows):
+        with self._lock:
+            for source, target, score in rows:
+                self._relationship_scores[(source, target)] = score
+
+    def load_selection_history(self):
+        with self._lock:
+            return [Row(('persona', 'kind', 'slot', 'turn', 'choice'), key + value)
+                    for key, value in self._selection_history.items()]
+
+    def save_selection_history(self, rows):
+        with self._lock:
+            for persona, kind, slot, turn, choice in rows:
+                self._selection_history[(persona, kind, slot)] = (turn, choice)
+
+    @staticmethod
+    def _row(record, columns):
+        return Row(columns, tuple(record[c] for c in columns))
+
+
+BACKENDS = {'sqlite': SQLiteStorage, 'readonly': ReadOnlyStorage, 'snapshot': SnapshotStorage, 'memory': MemoryStorage}
+
+def get_storage(kind='sqlite', **kwargs):
+    """Builds a storage backend by name ('sqlite', 'readonly', 'snapshot' or 'memory')."""
+    try:
+        backend = BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend '{kind}'. Choose one of: {', '.join(BACKENDS)}")
+    return backend(**kwargs)
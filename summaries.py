@@ -0,0 +1,167 @@
+import json
+import re
+from collections import Counter, OrderedDict
+
+from storage import Row, SUMMARY_COLUMNS
+
+# --- THREAD SUMMARIES ---
+# Every comment, and the post itself as node 0, has a summary of its whole
+# subtree: how many comments it holds, who wrote them, how deep it goes and a
+# short digest built from its own lead sentence plus the digests of its
+# biggest replies. A summary only depends on the node and its direct replies,
+# so a new comment recomputes the path from that comment up to the post and
+# nothing else. Digests are capped, so a thread's context stays the same size
+# however long the thread gets. A thread loaded from storage reuses the stored
+# summaries that still match it and recomputes only the rest.
+
+LEAD_CHARS = 120            # characters kept from a comment's first sentence
+BRANCHES_SHOWN = 3          # biggest replies folded into a node's digest
+DIGEST_CHARS = 600
+PARTICIPANTS_SHOWN = 5
+MAX_THREADS = 256           # thread trees kept in memory, least recently used evicted first
+
+ROOT = 0
+
+
+def lead(text, limit=LEAD_CHARS):
+    """The first sentence of `text`, cut to `limit` characters."""
+    text = ' '.join(str(text).split())
+    sentence = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit - 1].rstrip() + '…'
+
+def clip(text, limit=DIGEST_CHARS):
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+
+class ThreadTree:
+    """One thread's comments and the summary of every subtree."""
+    def __init__(self, post, comments):
+        self.post_id = post['id']
+        self.nodes = {ROOT: {'author': post['author_name'], 'text': f"{post['title']}. {post['content']}",
+                             'parent': None, 'children': [], 'summary': None}}
+        for comment in comments:
+            self._attach(comment['id'], comment['author_name'], comment['content'], comment['parent_comment_id'])
+
+    def _attach(self, node_id, author, text, parent_id):
+        parent_id = parent_id if parent_id in self.nodes else ROOT
+        self.nodes[node_id] = {'author': author, 'text': text, 'parent': parent_id, 'children': [], 'summary': None}
+        self.nodes[parent_id]['children'].append(node_id)
+
+    def path_to_root(self, node_id):
+        while node_id is not None:
+            yield node_id
+            node_id = self.nodes[node_id]['parent']
+
+    def summarize(self, node_id):
+        """Recomputes one node's summary from its own text and its replies' summaries."""
+        node = self.nodes[node_id]
+        children = [self.nodes[c]['summary'] for c in node['children']]
+        authors = Counter()
+        for child in children:
+            authors.update(child['authors'])
+        if node_id != ROOT:
+            authors[node['author']] += 1
+        branches = sorted(children, key=lambda c: c['comments'], reverse=True)[:BRANCHES_SHOWN]
+        own = '' if node_id == ROOT else f"{node['author']}: {lead(node['text'])}"
+        replies = ' | '.join(b['digest'] for b in branches)
+        if own and replies:
+            digest = f"{own} ⤷ ({replies})"
+        else:
+            digest = own or replies
+        node['summary'] = {
+            'comments': (node_id != ROOT) + sum(c['comments'] for c in children),
+            'depth': 1 + max(c['depth'] for c in children) if children else 0,
+            'authors': dict(authors),
+            'digest': clip(digest),
+        }
+        return node['summary']
+
+    def _bottom_up(self):
+        order, stack = [], [ROOT]
+        while stack:
+            node_id = stack.pop()
+            order.append(node_id)
+            stack.extend(self.nodes[node_id]['children'])
+        return reversed(order)
+
+    def restore(self, stored):
+        """Takes each summary from `stored` ({node_id: row}) if it still holds: it counts
+        the comments now in the subtree and none of the node's replies changed. The
+        rest are recomputed. Returns the ids of the recomputed nodes."""
+        recomputed, counts = set(), {}
+        for node_id in self._bottom_up():
+            node = self.nodes[node_id]
+            counts[node_id] = (node_id != ROOT) + sum(counts[c] for c in node['children'])
+            row = stored.get(node_id)
+            if (row is not None and row['comments'] == counts[node_id]
+                    and not any(c in recomputed for c in node['children'])):
+                node['summary'] = {'comments': row['comments'], 'depth': row['depth'],
+                                   'authors': json.loads(row['participants']), 'digest': row['digest']}
+            else:
+                self.summarize(node_id)
+                recomputed.add(node_id)
+        return recomputed
+
+    def add(self, node_id, author, text, parent_id):
+        """Attaches a new comment and recomputes only the summaries on its path to the post."""
+        self._attach(node_id, author, text, parent_id)
+        changed = list(self.path_to_root(node_id))
+        for changed_id in changed:
+            self.summarize(changed_id)
+        return changed
+
+    def row(self, node_id):
+        summary = self.nodes[node_id]['summary']
+        return (self.post_id, node_id, summary['comments'], summary['depth'],
+                json.dumps(summary['authors'], sort_keys=True), summary['digest'])
+
+
+def describe(row):
+    """Prompt- and viewer-ready text for a stored summary row."""
+    if not row or not row['comments']: return ''
+    authors = json.loads(row['participants'])
+    top = sorted(authors.items(), key=lambda item: (-item[1], item[0]))[:PARTICIPANTS_SHOWN]
+    who = ', '.join(f"{name} ({count})" for name, count in top)
+    return (f"{row['comments']} comment{'s' if row['comments'] != 1 else ''} from {who}; "
+            f"longest reply chain {row['depth']}. Main branches: {row['digest']}")
+
+
+class ThreadSummarizer:
+    """Keeps thread summaries in storage up to date as the engine adds comments."""
+    def __init__(self, storage, max_threads=MAX_THREADS):
+        self.storage = storage
+        self.max_threads = max_threads
+        self._threads = OrderedDict()
+        self.stats = {'recomputed': 0, 'reused': 0}
+
+    def _thread(self, post_id):
+        tree = self._threads.get(post_id)
+        if tree is not None:
+            self._threads.move_to_end(post_id)
+            return tree
+        post = self.storage.get_post(post_id)
+        if post is None: return None
+        tree = ThreadTree(post, self.storage.get_comments_for_post(post_id))
+        # Stored summaries that still match the thread are reused; only the rest are recomputed and written
+        recomputed = tree.restore({row['node_id']: row for row in self.storage.get_thread_summaries(post_id)})
+        if recomputed: self.storage.save_thread_summaries([tree.row(n) for n in recomputed])
+        self.stats['recomputed'] += len(recomputed)
+        self.stats['reused'] += len(tree.nodes) - len(recomputed)
+        self._threads[post_id] = tree
+        if len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+        return tree
+
+    def add_comment(self, post_id, comment_id, author, content, parent_comment_id=None):
+        """Folds a stored comment into its thread's summaries."""
+        tree = self._thread(post_id)
+        if tree is None or comment_id in tree.nodes: return
+        changed = tree.add(comment_id, author, content, parent_comment_id)
+        self.storage.save_thread_summaries([tree.row(n) for n in changed])
+        self.stats['recomputed'] += len(changed)
+
+    def context(self, post_id, node_id=ROOT):
+        """A constant-size description of a thread (or one subtree) for prompts."""
+        tree = self._thread(post_id)
+        if tree is None or node_id not in tree.nodes: return ''
+        return describe(Row(SUMMARY_COLUMNS, tree.row(node_id)))
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Importing mainr must stay cheap: viewers and workers import it without ever
+# calling the model, so .env and the model SDK are only loaded by get_router().
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET = 0.5         # seconds; about 40 ms on a laptop without the SDK
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import mainr
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in ('google.generativeai', 'dotenv') if m in sys.modules]}))
+"""
+
+
+# Empty stand-ins for the SDK and dotenv, first on the probe's path, so an eager
+# import succeeds and shows up in sys.modules even where neither is installed.
+STUBS = ('google/__init__.py', 'google/generativeai/__init__.py', 'dotenv.py')
+
+
+def import_mainr():
+    with tempfile.TemporaryDirectory() as stubs:
+        for stub in STUBS:
+            path = os.path.join(stubs, stub)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [stubs, os.environ.get('PYTHONPATH')])))
+        result = subprocess.run([sys.executable, '-c', PROBE], cwd=REPO, env=env,
+                                capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_mainr_import_skips_model_sdk():
+    assert import_mainr()['loaded'] == []
+
+
+def test_mainr_import_within_budget():
+    # Best of three, so one slow start on a busy machine doesn't fail the test
+    elapsed = min(import_mainr()['elapsed'] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, f"import mainr took {elapsed:.3f}s (budget {IMPORT_BUDGET}s)"
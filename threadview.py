@@ -0,0 +1,79 @@
+import html
+
+# --- COMMENT TREE RENDERING ---
+# The viewer draws a thread as one HTML block per page instead of one Streamlit
+# widget per comment. The tree is flattened iteratively (no recursion limit for
+# long reply chains) into display order, split into pages of a fixed number of
+# comments, and replies deeper than COLLAPSE_DEPTH are folded behind a
+# <details> toggle so long chains don't push the rest of the page away.
+
+COMMENTS_PER_PAGE = 100
+COLLAPSE_DEPTH = 4          # replies at this depth and below start collapsed
+MAX_INDENT = 8              # deeper replies stop moving right
+INDENT_EM = 1.2
+
+
+def flatten(comments):
+    """(depth, comment, replies below it) for every comment, in display order:
+    each comment followed by its replies, oldest first. Comments whose parent is
+    missing are shown at the top level."""
+    by_id = {c['id']: c for c in comments}
+    children = {}
+    roots = []
+    for comment in comments:
+        parent = comment['parent_comment_id']
+        if parent is None or parent not in by_id or parent == comment['id']:
+            roots.append(comment)
+        else:
+            children.setdefault(parent, []).append(comment)
+
+    order = []
+    stack = [(0, c) for c in reversed(roots)]
+    while stack:
+        depth, comment = stack.pop()
+        order.append((depth, comment))
+        stack.extend((depth + 1, c) for c in reversed(children.get(comment['id'], ())))
+
+    # Replies below each comment, counted children first
+    below = {}
+    for depth, comment in reversed(order):
+        below[comment['id']] = sum(1 + below[c['id']] for c in children.get(comment['id'], ()))
+    return [(depth, comment, below[comment['id']]) for depth, comment in order]
+
+
+def page_count(flat, per_page=COMMENTS_PER_PAGE):
+    return max(1, -(-len(flat) // per_page))
+
+
+def comment_html(depth, comment):
+    indent = min(depth, MAX_INDENT) * INDENT_EM
+    text = html.escape(str(comment['content'])).replace('\n', '<br>')
+    return (f'<div style="margin:0 0 0.6em {indent}em;padding-left:0.6em;border-left:2px solid rgba(128,128,128,0.35)">'
+            f'<b>{html.escape(str(comment["author_name"]))}</b> '
+            f'<span style="opacity:0.6;font-size:0.85em">{html.escape(str(comment["timestamp"]))}</span>'
+            f'<div>{text}</div></div>')
+
+
+def render_page(flat, page=0, per_page=COMMENTS_PER_PAGE, collapse_depth=COLLAPSE_DEPTH):
+    """HTML for one page of a flattened thread. A collapsed branch cut by a page
+    break is reopened as "continued" on the next page."""
+    start = page * per_page
+    items = flat[start:start + per_page]
+    parts, collapsed = [], False
+    for i, (depth, comment, _) in enumerate(items):
+        if depth >= collapse_depth and not collapsed:
+            previous = flat[start + i - 1] if start + i > 0 else None
+            if previous is not None and previous[0] == collapse_depth - 1:
+                label = f"{previous[2]} more repl{'y' if previous[2] == 1 else 'ies'} to {html.escape(str(previous[1]['author_name']))}"
+            else:
+                label = "continued"
+            parts.append(f'<details><summary style="margin:0 0 0.6em {min(depth, MAX_INDENT) * INDENT_EM}em;'
+                         f'cursor:pointer;opacity:0.75">{label}</summary>')
+            collapsed = True
+        elif depth < collapse_depth and collapsed:
+            parts.append('</details>')
+            collapsed = False
+        parts.append(comment_html(depth, comment))
+    if collapsed:
+        parts.append('</details>')
+    return ''.join(parts)
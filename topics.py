@@ -0,0 +1,146 @@
+import json
+import os
+import random
+import threading
+
+from router import TASK_TITLE
+
+# --- TOPIC SCHEDULER ---
+# topics.json is read once per process. Each pick is weighted toward topics that
+# have been posted about less and whose threads draw more comments. Both figures
+# come from the topic_stats table in storage, so they survive restarts; picks made
+# since the last refresh are counted on top. An optional background thread asks
+# the model for fresh topics before the pool runs dry.
+
+TOPICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topics.json')
+LOW_WATER = 2           # fresh topics per subreddit below which the generator tops the pool up
+BATCH_SIZE = 5          # topics requested from the model per generation call
+GENERATE_EVERY = 30     # seconds between generator passes
+
+# The voice used when the model is asked for new topics
+MODERATOR_PERSONA = {
+    'name': 'Moderator',
+    'archetype': 'Community moderator who keeps discussions lively',
+    'demographics': {'location': 'the internet'},
+    'speech_patterns': 'Neutral, concise, provocative questions.',
+}
+
+_topics_cache = {}
+_cache_lock = threading.Lock()
+
+def load_topics(path=TOPICS_PATH):
+    """Reads a topics file once per process and returns a copy of its entries."""
+    with _cache_lock:
+        if path not in _topics_cache:
+            with open(path, 'r') as f:
+                _topics_cache[path] = json.load(f)
+        return [dict(t) for t in _topics_cache[path]]
+
+
+class TopicScheduler:
+    def __init__(self, storage=None, path=TOPICS_PATH):
+        self.storage = storage
+        self.topics = load_topics(path)
+        self.posted = {}                # (subreddit, topic) -> stored posts, as of the last refresh
+        self.uses = {}                  # (subreddit, topic) -> times picked since the last refresh
+        self.fresh = {}                 # subreddit -> generated topics not used yet
+        self.engagement = {}            # subreddit -> comments per post
+        self.topic_engagement = {}      # (subreddit, topic) -> comments per post
+        self._lock = threading.Lock()
+        self._wanted = set()            # subreddits the generator should top up
+        self._generator = None
+        self._stop = threading.Event()
+
+    # --- STATS ---
+    def refresh_stats(self):
+        """Pulls per-topic usage and engagement, and per-subreddit engagement, from storage."""
+        if self.storage is None: return
+        stats = {row['subreddit']: row['comments'] / row['posts']
+                 for row in self.storage.get_subreddit_stats() if row['posts']}
+        topic_rows = self.storage.get_topic_stats()
+        with self._lock:
+            self.engagement = stats
+            self.posted = {(row['subreddit'], row['topic']): row['posts'] for row in topic_rows}
+            self.topic_engagement = {(row['subreddit'], row['topic']): row['comments'] / row['posts']
+                                     for row in topic_rows if row['posts']}
+            self.uses = {}
+
+    def _weight(self, topic):
+        """Topics never posted about fall back to their subreddit's engagement."""
+        key = (topic['subreddit'], topic['topic'])
+        uses = self.posted.get(key, 0) + self.uses.get(key, 0)
+        engagement = self.topic_engagement.get(key, self.engagement.get(topic['subreddit'], 0))
+        return (1 + engagement) / (1 + uses) ** 2
+
+    # --- PICKING ---
+    def pick(self, subreddit=None):
+        """A {'subreddit', 'topic'} entry, optionally restricted to one subreddit."""
+        with self._lock:
+            fresh = self.fresh.get(subreddit) if subreddit else None
+            if fresh:
+                chosen = fresh.pop(0)
+                self.topics.append(chosen)
+            else:
+                candidates = [t for t in self.topics if subreddit is None or t['subreddit'] == subreddit]
+                if not candidates:
+                    # Nothing written for this subreddit yet: borrow any topic and ask for real ones
+                    candidates = [dict(t, subreddit=subreddit) for t in self.topics]
+                    self._wanted.add(subreddit)
+                chosen = random.choices(candidates, weights=[self._weight(t) for t in candidates], k=1)[0]
+            key = (chosen['subreddit'], chosen['topic'])
+            self.uses[key] = self.uses.get(key, 0) + 1
+            if subreddit and len(self.fresh.get(subreddit, [])) < LOW_WATER:
+                self._wanted.add(subreddit)
+            return dict(chosen)
+
+    # --- BACKGROUND GENERATION ---
+    def generate_topics(self, subreddit, count=BATCH_SIZE):
+        """Asks the model for `count` new topics for `subreddit` and adds them to the fresh pool."""
+        from mainr import get_ai_response
+        from admission import PRIORITY_INIT
+        prompt = (f"Suggest {count} new, distinct discussion topics for the subreddit {subreddit}. "
+                  "Each should be one provocative sentence or question. "
+                  "Reply with one topic per line and nothing else.")
+        text = get_ai_response(MODERATOR_PERSONA, prompt, priority=PRIORITY_INIT, task=TASK_TITLE)
+        if not text: return 0
+        with self._lock:
+            known = {t['topic'] for t in self.topics} | {t['topic'] for t in self.fresh.get(subreddit, [])}
+            added = 0
+            for line in text.splitlines():
+                topic = line.strip().lstrip('-*0123456789.) ').strip()
+                if len(topic) < 10 or topic in known: continue
+                self.fresh.setdefault(subreddit, []).append({'subreddit': subreddit, 'topic': topic})
+                known.add(topic)
+                added += 1
+            return added
+
+    def start_generator(self, subreddits=()):
+        """Starts a daemon thread that keeps each subreddit's fresh pool topped up."""
+        with self._lock:
+            self._wanted.update(subreddits)
+        if self._generator is None:
+            self._generator = threading.Thread(target=self._generate_loop, name='topic-generator', daemon=True)
+            self._generator.start()
+
+    def _generate_loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                wanted = [s for s in self._wanted if len(self.fresh.get(s, [])) < LOW_WATER]
+                self._wanted.clear()
+            for subreddit in wanted:
+                self.generate_topics(subreddit)
+            self.refresh_stats()
+            self._stop.wait(GENERATE_EVERY)
+
+    def stop(self):
+        self._stop.set()
+
+
+_default_scheduler = None
+
+def default_scheduler():
+    """The process-wide scheduler used by the one-off conversation simulations."""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = TopicScheduler()
+    return _default_scheduler
@@ -1,65 +1,74 @@
 import streamlit as st
-import sqlite3
-import os
 import time
+from datetime import timedelta
+
+from analytics import ReplyGraph
+from clock import to_micros
+from config import config
+from profiling import profile_rerun
+from storage import SQLiteStorage, SnapshotStorage
+from summaries import ROOT, describe
+from threadview import flatten, page_count, render_page
 # btw the file is called window.py because "app" is a reserved word in default simulator setup
 # --- DATABASE HELPER FUNCTIONS ---
-# These functions will read from the world.db file created by engine.py
+# These functions read from the world.db file written by engine.py (see storage.py).
+# By default they read an in-memory snapshot retaken every GENESIS_SNAPSHOT_SECONDS,
+# so any number of dashboards costs the engine one copy per interval; 0 reads live.
 
-def get_db_connection():
-    """Connects to the SQLite database."""
-    # This path assumes app.py is in the root of your project folder
-    db_path = os.path.join(os.path.dirname(__file__), 'world.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row  # Allows accessing columns by name
-    return conn
+@st.cache_resource
+def get_storage_backend():
+    """One shared storage handle for every viewer session."""
+    return SnapshotStorage() if config['db.snapshot_seconds'] > 0 else SQLiteStorage()
 
 def get_active_subreddits():
     """Fetches a list of subreddits that have posts."""
-    conn = get_db_connection()
-    subreddits = conn.execute('SELECT DISTINCT subreddit FROM posts ORDER BY subreddit ASC').fetchall()
-    conn.close()
-    return [row['subreddit'] for row in subreddits]
-
-def get_posts_for_subreddit(subreddit):
-    """Fetches all posts for a selected subreddit."""
-    conn = get_db_connection()
-    posts = conn.execute('SELECT * FROM posts WHERE subreddit = ? ORDER BY timestamp DESC', (subreddit,)).fetchall()
-    conn.close()
-    return posts
-
-# UPDATED: Fetches and organizes comments into a threaded structure
-def get_comments_for_post_threaded(post_id):
-    conn = get_db_connection()
-    comments_raw = conn.execute('SELECT * FROM comments WHERE post_id = ? ORDER BY timestamp ASC', (post_id,)).fetchall()
-    conn.close()
-    
-    comments_by_id = {c['id']: dict(c) for c in comments_raw}
-    threaded_comments = []
-    
-    for cid, comment in comments_by_id.items():
-        if comment['parent_comment_id'] is None:
-            threaded_comments.append(comment)
-        else:
-            parent = comments_by_id.get(comment['parent_comment_id'])
-            if parent:
-                if 'replies' not in parent:
-                    parent['replies'] = []
-                parent['replies'].append(comment)
-                
-    return threaded_comments
-
-# NEW: A function to display comments recursively
-def display_comment_thread(comments, level=0):
-    for comment in comments:
-        with st.chat_message(name=comment['author_name']):
-            # Indent replies to show nesting
-            st.markdown(f"{'<blockquote>' * level}{comment['content']}{'</blockquote>' * level}", unsafe_allow_html=True)
-        
-        if 'replies' in comment:
-            display_comment_thread(comment['replies'], level + 1)
+    return get_storage_backend().get_active_subreddits()
+
+POSTS_PER_PAGE = 10
+
+def get_high_water():
+    """Changes whenever the engine writes a post or comment; used as the cache key below."""
+    return get_storage_backend().get_high_water()
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_posts_page(subreddit, before, high_water):
+    """Fetches one page of posts (newest first) starting after the `before` cursor."""
+    return [dict(p) for p in get_storage_backend().get_posts_page(subreddit, before, POSTS_PER_PAGE + 1)]
+
+@st.cache_resource
+def get_reply_graph():
+    """The reply graph lives across reruns and only reads comments it hasn't seen yet."""
+    return ReplyGraph(get_storage_backend())
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_flat_comments(post_id, high_water):
+    """The thread in display order as (depth, comment, replies below) tuples."""
+    return [(depth, dict(c), below) for depth, c, below in flatten(get_storage_backend().get_comments_for_post(post_id))]
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def get_comment_page(post_id, high_water, page):
+    """One page of a thread as a single pre-rendered HTML block."""
+    return render_page(get_flat_comments(post_id, high_water), page)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_thread_summary(post_id, high_water):
+    """The engine's stored summary of a thread, shown while its comments are collapsed."""
+    rows = get_storage_backend().get_thread_summaries(post_id, [ROOT])
+    return describe(rows[0]) if rows else ""
+
+def display_comment_thread(post_id, high_water):
+    """Shows one page of a thread; long threads get a page picker."""
+    flat = get_flat_comments(post_id, high_water)
+    pages = page_count(flat)
+    page = 0
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages}, {len(flat)} comments)", min_value=1, max_value=pages,
+                               value=1, key=f"comment_page_{post_id}") - 1
+    st.markdown(get_comment_page(post_id, high_water, page), unsafe_allow_html=True)
 
 # --- STREAMLIT FRONT-END ---
+rerun_profiler = profile_rerun('window')     # only while profile.on exists (see profiling.py)
+config.reload_if_changed()
 st.set_page_config(layout="wide", page_title="Genesis Chamber")
 st.title("🤖 The Genesis Chamber")
 st.caption("A real-time viewer for the autonomous AI society.")
@@ -67,8 +76,12 @@ st.caption("A real-time viewer for the autonomous AI society.")
 # --- SIDEBAR FOR CONTROLS ---
 st.sidebar.header("View Settings")
 
+page = st.sidebar.radio("Page:", ["Threads", "Search", "Reply graph"])
+
 active_subreddits = get_active_subreddits()
-if not active_subreddits:
+if page != "Threads":
+    selected_subreddit = None
+elif not active_subreddits:
     st.sidebar.warning("No activity yet. Make sure engine.py is running.")
     selected_subreddit = None
 else:
@@ -77,34 +90,102 @@ else:
         options=active_subreddits
     )
 
-auto_refresh = st.sidebar.checkbox("Auto-refresh every 10 seconds", value=True)
+refresh_seconds = config['timing.viewer_refresh']
+auto_refresh = st.sidebar.checkbox(f"Auto-refresh every {refresh_seconds:g} seconds", value=True)
 
 # --- MAIN DISPLAY AREA ---
-if selected_subreddit:
+if page == "Search":
+    st.header("Search posts and comments")
+    search_text = st.text_input("Search for:", placeholder="e.g. consciousness, singular*")
+    col_author, col_sub, col_since, col_until = st.columns(4)
+    author_filter = col_author.text_input("Author:")
+    subreddit_filter = col_sub.selectbox("Subreddit:", ["Any"] + active_subreddits)
+    since_filter = col_since.date_input("From:", value=None)
+    until_filter = col_until.date_input("Until:", value=None)
+    if search_text:
+        results = get_storage_backend().search(
+            search_text,
+            author=author_filter or None,
+            subreddit=None if subreddit_filter == "Any" else subreddit_filter,
+            since=to_micros(since_filter) if since_filter else None,
+            until=to_micros(until_filter + timedelta(days=1)) - 1 if until_filter else None,
+            limit=50,
+        )
+        st.caption(f"{len(results)} result(s)")
+        for hit in results:
+            kind = "Post" if hit['kind'] == 'post' else "Comment"
+            st.markdown(f"**{kind}** by *{hit['author_name']}* in {hit['subreddit']} · *{hit['title']}* · {hit['timestamp']}")
+            st.markdown(f"> {hit['snippet']}")
+elif page == "Reply graph":
+    st.header("Reply graph")
+    graph = get_reply_graph()
+    graph.refresh()
+    summary = graph.summary()
+    if not summary['comments']:
+        st.info("No comments yet...")
+    else:
+        cols = st.columns(4)
+        cols[0].metric("Comments", summary['comments'])
+        cols[1].metric("Personas", summary['personas'])
+        cols[2].metric("Reciprocity", summary['reciprocity'])
+        cols[3].metric("Max thread depth", summary['max_depth'])
+
+        st.markdown("##### Who replies to whom")
+        st.dataframe(graph.persona_stats(), use_container_width=True)
+
+        left, right = st.columns(2)
+        with left:
+            st.markdown("##### Thread depth")
+            st.dataframe([{'depth': d, 'comments': c} for d, c in graph.depth_distribution().items()], use_container_width=True)
+        with right:
+            st.markdown("##### Conversation cascades")
+            st.dataframe([{'cascade size': s, 'cascades': c} for s, c in graph.cascade_sizes().items()], use_container_width=True)
+elif selected_subreddit:
     st.header(f"Viewing posts in r/{selected_subreddit}")
-    posts = get_posts_for_subreddit(selected_subreddit)
-    
+    high_water = get_high_water()
+
+    # Keyset pagination: remember the cursor each page started from, per subreddit
+    cursors = st.session_state.setdefault('page_cursors', {}).setdefault(selected_subreddit, [None])
+    page_rows = get_posts_page(selected_subreddit, cursors[-1], high_water)
+    posts, has_older = page_rows[:POSTS_PER_PAGE], len(page_rows) > POSTS_PER_PAGE
+
     if not posts:
         st.info("No posts in this subreddit yet.")
     else:
         for post in posts:
-            with st.expander(f"**{post['title']}** (posted by *{post['author_name']}*)"):
+            archived_label = " · archived" if post.get('archived') else ""
+            with st.expander(f"**{post['title']}** (posted by *{post['author_name']}*{archived_label})"):
                 with st.chat_message(name=post['author_name']):
                     st.markdown(post['content'])
                 
                 st.markdown("---")
                 st.markdown("##### Comments")
 
-                # UPDATED: Use the new threaded display function
-                threaded_comments = get_comments_for_post_threaded(post['id'])
-                if not threaded_comments:
-                    st.write("*No comments yet...*")
+                # Comment trees are only fetched for threads the reader asks to see
+                if st.toggle("Show comments", key=f"show_comments_{post['id']}"):
+                    if not get_flat_comments(post['id'], high_water):
+                        st.write("*No comments yet...*")
+                    else:
+                        display_comment_thread(post['id'], high_water)
                 else:
-                    display_comment_thread(threaded_comments)
+                    summary = get_thread_summary(post['id'], high_water)
+                    if summary:
+                        st.caption(summary)
+
+        col_newer, col_page, col_older = st.columns([1, 2, 1])
+        if col_newer.button("← Newer", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        col_page.caption(f"Page {len(cursors)}")
+        if col_older.button("Older →", disabled=not has_older):
+            cursors.append((posts[-1]['created_us'], posts[-1]['id']))
+            st.rerun()
 else:
     st.info("Waiting for the simulation to generate content...")
 
+if rerun_profiler: rerun_profiler.stop()
+
 # --- AUTO-REFRESH LOGIC ---
 if auto_refresh:
-    time.sleep(10)
+    time.sleep(max(1, refresh_seconds))
     st.rerun()
\ No newline at end of file